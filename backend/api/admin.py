@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from .models import (FavoriteRecipe, Ingredient, IngredientToRecipe, Recipe,
-                     ShoppingList, Subscription, Tag)
+from .models import (FavoriteRecipe, FeedEntry, ImageJob, Ingredient,
+                     IngredientToRecipe, Recipe, ShoppingList,
+                     ShoppingListIngredient, Subscription, Tag)
 
 
 @admin.register(Recipe)
@@ -25,10 +26,9 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     empty_value_display = '-пусто-'
 
+    @admin.display(ordering='favorites_count')
     def favorite_count(self, obj):
-        return FavoriteRecipe.objects.filter(
-            favorite_recipe=obj
-        ).count()
+        return obj.favorites_count
 
 
 @admin.register(Tag)
@@ -88,3 +88,31 @@ class ShoppingListAdmin(admin.ModelAdmin):
         'user',
         'shop_recipe'
     )
+
+
+@admin.register(ShoppingListIngredient)
+class ShoppingListIngredientAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'ingredient',
+        'amount',
+        'recipes_count'
+    )
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'recipe'
+    )
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'recipe',
+        'requested_at',
+        'attempts',
+        'error'
+    )
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.4 on 2026-10-18 19:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def fill_shopping_list_ingredients(apps, schema_editor):
+    ShoppingList = apps.get_model('api', 'ShoppingList')
+    ShoppingListIngredient = apps.get_model('api', 'ShoppingListIngredient')
+    totals = ShoppingList.objects.filter(
+        shop_recipe__ingredienttorecipe__isnull=False
+    ).values(
+        'user_id', 'shop_recipe__ingredienttorecipe__ingredient'
+    ).annotate(
+        amount=Sum('shop_recipe__ingredienttorecipe__amount'),
+        recipes_count=Count('id')
+    ).order_by()
+    ShoppingListIngredient.objects.bulk_create(
+        ShoppingListIngredient(
+            user_id=row['user_id'],
+            ingredient_id=row['shop_recipe__ingredienttorecipe__ingredient'],
+            amount=row['amount'],
+            recipes_count=row['recipes_count']
+        ) for row in totals
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0006_remove_recipe_is_favorited_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Суммарное количество')),
+                ('recipes_count', models.IntegerField(default=0, verbose_name='Количество рецептов с ингредиентом')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_ingredient'),
+        ),
+        migrations.RunPython(
+            fill_shopping_list_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+# Отдельно от слияния дубликатов: PostgreSQL не выполняет ALTER TABLE
+# в транзакции с отложенными проверками внешних ключей после удалений.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
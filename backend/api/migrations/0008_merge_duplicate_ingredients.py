@@ -0,0 +1,59 @@
+# Generated by Django 4.2.4 on 2026-10-18 19:28
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('api', 'Ingredient')
+    IngredientToRecipe = apps.get_model('api', 'IngredientToRecipe')
+    ShoppingListIngredient = apps.get_model('api', 'ShoppingListIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep_id']).values_list('id', flat=True))
+        for link in IngredientToRecipe.objects.filter(
+            ingredient_id__in=duplicate_ids
+        ):
+            kept = IngredientToRecipe.objects.filter(
+                recipe_id=link.recipe_id, ingredient_id=group['keep_id']
+            ).first()
+            if kept is None:
+                link.ingredient_id = group['keep_id']
+                link.save()
+            else:
+                kept.amount += link.amount
+                kept.save()
+                link.delete()
+        for row in ShoppingListIngredient.objects.filter(
+            ingredient_id__in=duplicate_ids
+        ):
+            kept = ShoppingListIngredient.objects.filter(
+                user_id=row.user_id, ingredient_id=group['keep_id']
+            ).first()
+            if kept is None:
+                row.ingredient_id = group['keep_id']
+                row.save()
+            else:
+                kept.amount += row.amount
+                kept.recipes_count += row.recipes_count
+                kept.save()
+                row.delete()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_shoppinglistingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.4 on 2026-10-18 19:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('api', 'Recipe')
+    FavoriteRecipe = apps.get_model('api', 'FavoriteRecipe')
+    ShoppingList = apps.get_model('api', 'ShoppingList')
+    Subscription = apps.get_model('api', 'Subscription')
+    FoodGramUser = apps.get_model('users', 'FoodGramUser')
+    Recipe.objects.update(
+        favorites_count=count_of(FavoriteRecipe, 'favorite_recipe'),
+        in_cart_count=count_of(ShoppingList, 'shop_recipe')
+    )
+    FoodGramUser.objects.update(
+        recipes_count=count_of(Recipe, 'author'),
+        followers_count=count_of(Subscription, 'following')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_ingredient_unique'),
+        ('users', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_cart_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество добавлений в список покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
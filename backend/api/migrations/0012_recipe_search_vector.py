@@ -0,0 +1,59 @@
+# Generated by Django 4.2.4 on 2026-10-18 19:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('pg_catalog.russian', coalesce({row}name, '')), 'A')"
+    " || setweight(to_tsvector('pg_catalog.russian', coalesce({row}text, '')),"
+    " 'B')"
+)
+
+CREATE_SQL = f'''
+CREATE FUNCTION api_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_recipe_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, text ON api_recipe
+FOR EACH ROW EXECUTE FUNCTION api_recipe_search_vector_update();
+
+UPDATE api_recipe SET search_vector = {SEARCH_VECTOR.format(row='')};
+
+CREATE INDEX api_recipe_search_vector_idx
+ON api_recipe USING gin (search_vector);
+'''
+
+DROP_SQL = '''
+DROP INDEX IF EXISTS api_recipe_search_vector_idx;
+DROP TRIGGER IF EXISTS api_recipe_search_vector_trigger ON api_recipe;
+DROP FUNCTION IF EXISTS api_recipe_search_vector_update();
+'''
+
+
+def run_on_postgresql(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_recipe_tags_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор названия и описания'),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SQL), run_on_postgresql(DROP_SQL)
+        ),
+    ]
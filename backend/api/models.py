@@ -1,9 +1,15 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
+from django.core.files.storage import storages
 from django.db import models
 
 from users.models import FoodGramUser
 
 
+def recipe_image_storage():
+    return storages['recipe_images']
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         FoodGramUser,
@@ -16,6 +22,7 @@ class Recipe(models.Model):
         verbose_name='Название блюда'
     )
     image = models.ImageField(
+        storage=recipe_image_storage,
         verbose_name='Картинка блюда',
     )
     text = models.TextField(
@@ -33,8 +40,57 @@ class Recipe(models.Model):
     cooking_time = models.IntegerField(
         verbose_name='Время приготовления в минутах',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество добавлений в избранное'
+    )
+    in_cart_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество добавлений в список покупок'
+    )
+    popularity = models.FloatField(
+        default=0,
+        verbose_name='Популярность с учетом давности добавлений в избранное'
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор названия и описания'
+    )
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['-popularity', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['cooking_time', 'id'],
+                name='recipe_quick_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_new_idx'
+            ),
+            models.Index(
+                fields=['author', '-popularity', '-id'],
+                name='recipe_author_popular_idx'
+            ),
+            models.Index(
+                fields=['author', 'cooking_time', 'id'],
+                name='recipe_author_quick_idx'
+            ),
+            models.Index(
+                fields=['image'],
+                name='recipe_image_idx'
+            ),
+        ]
         ordering = ['id', ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
@@ -76,6 +132,12 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
         ordering = ['id', ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
@@ -156,6 +218,10 @@ class FavoriteRecipe(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Избранный рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         constraints = [
@@ -199,3 +265,101 @@ class ShoppingList(models.Model):
 
     def __str__(self) -> str:
         return 'Список покупок'
+
+
+class ShoppingListIngredient(models.Model):
+    user = models.ForeignKey(
+        FoodGramUser,
+        related_name='shopping_list_ingredients',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Суммарное количество'
+    )
+    recipes_count = models.IntegerField(
+        default=0,
+        verbose_name='Количество рецептов с ингредиентом'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient'
+            )
+        ]
+        ordering = ['id', ]
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} для {self.user}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        FoodGramUser,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        ordering = ['id', ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class ImageJob(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        related_name='image_job',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    requested_at = models.DateTimeField(
+        verbose_name='Время постановки в очередь'
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Занята обработчиком до'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Количество попыток'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+
+    class Meta:
+        ordering = ['requested_at', ]
+        verbose_name = 'Задача обработки картинки'
+        verbose_name_plural = 'Задачи обработки картинок'
+
+    def __str__(self):
+        return f'Картинка рецепта {self.recipe_id}'
@@ -1,7 +1,6 @@
 import os
 from pathlib import Path
 
-
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -32,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram_api.metrics.MetricsMiddleware',
+    'foodgram_api.timing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,10 +40,65 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram_api.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
 
+REQUEST_TIMING_ENABLED = os.getenv(
+    'REQUEST_TIMING_ENABLED', 'True'
+) == 'True'
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'False') == 'True'
+# Число запросов к БД замерено с пустым кешем, вместе с проверкой токена
+# и обработчиками on_commit, на PostgreSQL и SQLite оно совпадает.
+# Бюджеты проверяет foodgram_api/tests/test_query_budgets.py
+REQUEST_BUDGETS = {
+    'default': {'queries': 10, 'total_ms': 500},
+    'RecipesViewSet.list': {'queries': 9},
+    'RecipesViewSet.retrieve': {'queries': 6},
+    'RecipesViewSet.feed': {'queries': 6},
+    'RecipesViewSet.can_cook': {'queries': 6},
+    'RecipesViewSet.create': {'queries': 26, 'total_ms': 1000},
+    'RecipesViewSet.update': {'queries': 30, 'total_ms': 1000},
+    'RecipesViewSet.partial_update': {'queries': 30, 'total_ms': 1000},
+    'RecipesViewSet.destroy': {'queries': 30},
+    'RecipesViewSet.shopping_cart': {'queries': 16},
+    'UsersViewSet.list': {'queries': 6},
+    'UsersViewSet.subscriptions': {'queries': 4},
+    'UsersViewSet.subscribe': {'queries': 12},
+    'TokenCreateView.post': {'queries': 5, 'total_ms': 1000},
+}
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR', BASE_DIR / 'metrics')
+METRICS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True') == 'True'
+PROFILES_DIR = os.getenv('PROFILES_DIR', BASE_DIR / 'profiles')
+PROFILES_MAX_COUNT = 50
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'foodgram_api': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 TEMPLATES_DIR = BASE_DIR / 'backend/templates'
 
 TEMPLATES = [
@@ -97,7 +153,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'foodgram_api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -105,11 +161,76 @@ REST_FRAMEWORK = {
 }
 
 
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 30
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', 'False') == 'True'
+TOKEN_CACHE_SHARED_TTL = 300
+
+
 DJOSER = {
     'LOGIN_FIELD': 'email'
 }
 
 
+# Через кеш процессы делят версии кешей, поколения ответов и журнал
+# индекса рецептов. С REDIS_URL это Redis: incr и add в нем атомарны.
+# Файловый кеш годится для одного сервера, но incr и add в нем
+# не атомарны между процессами, а при переполнении MAX_ENTRIES он
+# удаляет случайную треть ключей, включая версии.
+REDIS_URL = os.getenv('REDIS_URL')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 100000))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': CACHE_MAX_ENTRIES,
+        },
+    }
+}
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+
+INGREDIENT_INDEX_ENABLED = os.getenv(
+    'INGREDIENT_INDEX_ENABLED', 'True'
+) == 'True'
+INGREDIENT_INDEX_CHECK_INTERVAL = 5
+INGREDIENT_SEARCH_LIMIT = 50
+
+RECIPE_INDEX_ENABLED = os.getenv('RECIPE_INDEX_ENABLED', 'True') == 'True'
+RECIPE_INDEX_CHECK_INTERVAL = 5
+RECIPE_INDEX_MAX_MISSING = 5
+
+
+TAGS_MAX_AGE = 300
+
+SUBSCRIPTION_RECIPES_LIMIT = 10
+
+FEED_TIMELINE_ENABLED = os.getenv('FEED_TIMELINE_ENABLED', 'False') == 'True'
+
+POPULARITY_HALF_LIFE_DAYS = 7
+
+RECIPES_CACHE_ENABLED = os.getenv('RECIPES_CACHE_ENABLED', 'True') == 'True'
+RECIPES_CACHE_TIMEOUT = 300
+RECIPES_CACHE_LOCK_TIMEOUT = 5
+RECIPE_BODY_CACHE_ENABLED = os.getenv(
+    'RECIPE_BODY_CACHE_ENABLED', 'True'
+) == 'True'
+
+
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+
 LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
@@ -131,6 +252,41 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/recipes/images/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/recipes/images/')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'recipe_images': {
+        'BACKEND': 'foodgram_api.storage.ContentAddressedStorage',
+    },
+}
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+)
+# Тело JSON-запроса с картинкой в base64 (+1/3 к размеру файла)
+# и остальными полями рецепта. Файлы multipart сюда не считаются.
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGE_UPLOAD_MAX_SIZE * 4 // 3 + 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+
+IMAGE_VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+IMAGE_JPEG_QUALITY = 82
+IMAGE_WEBP_QUALITY = 80
+IMAGE_WORKER_PROCESSES = int(os.getenv('IMAGE_WORKER_PROCESSES', 2))
+IMAGE_JOB_LOCK_TIMEOUT = 300
+IMAGE_JOB_MAX_ATTEMPTS = 3
+IMAGE_RELEASE_GRACE = 60 * 60
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -2,9 +2,25 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
 
+from foodgram_api.metrics import metrics_view
+from foodgram_api.profiling import (profile_download_view, profile_stats_view,
+                                    profiles_view)
+
 urlpatterns = [
+    path('admin/profiles/', profiles_view, name='profiles'),
+    path(
+        'admin/profiles/<str:name>/',
+        profile_download_view,
+        name='profile_download'
+    ),
+    path(
+        'admin/profiles/<str:name>/stats/',
+        profile_stats_view,
+        name='profile_stats'
+    ),
     path('admin/', admin.site.urls),
     path('api/', include('foodgram_api.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('redoc/', TemplateView.as_view(
         template_name='redoc.html'
     ), name='redoc')
@@ -0,0 +1,168 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import FoodGramUser
+
+TOKEN_CACHE_KEY = 'auth_token:{digest}'
+TOKEN_REVOKED_KEY = 'auth_token_revoked:{digest}'
+USER_VERSION_KEY = 'auth_user_version:{user_id}'
+SNAPSHOT_EXCLUDE = ('password',)
+
+
+class TokenCache:
+    """Ограниченный LRU-кеш токен -> снимок пользователя с TTL.
+
+    Снимки хранятся в памяти процесса и, при TOKEN_CACHE_SHARED, в общем
+    кеше Django, хеш пароля в снимок не попадает. Каждое попадание
+    сверяется с общим кешем: не отозван ли токен и не сменилась ли
+    версия пользователя. Выход, смена пароля и блокировка действуют
+    во всех процессах сразу после коммита.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def marks_timeout():
+        """Отметки живут дольше любого снимка, локального или общего"""
+        return max(settings.TOKEN_CACHE_TTL, settings.TOKEN_CACHE_SHARED_TTL)
+
+    @staticmethod
+    def snapshot(user):
+        fields = [
+            field.attname for field in user._meta.concrete_fields
+            if field.attname not in SNAPSHOT_EXCLUDE
+        ]
+        return tuple(fields), tuple(getattr(user, name) for name in fields)
+
+    @staticmethod
+    def restore(snapshot):
+        field_names, values = snapshot
+        return FoodGramUser.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+    def get_user_version(self, user_id):
+        key = USER_VERSION_KEY.format(user_id=user_id)
+        version = cache.get(key)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(key, version, self.marks_timeout()):
+                version = cache.get(key, version)
+        return version
+
+    def is_valid(self, digest, entry):
+        """Токен не отозван, версия пользователя не сменилась"""
+        _, user_id, version = entry
+        revoked_key = TOKEN_REVOKED_KEY.format(digest=digest)
+        version_key = USER_VERSION_KEY.format(user_id=user_id)
+        marks = cache.get_many([revoked_key, version_key])
+        return revoked_key not in marks and marks.get(version_key) == version
+
+    def _store_local(self, key, entry):
+        with self._lock:
+            self._entries[key] = (
+                entry, time.monotonic() + settings.TOKEN_CACHE_TTL
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def _get_local(self, key):
+        with self._lock:
+            local = self._entries.get(key)
+            if local is None:
+                return None
+            if local[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return local[0]
+
+    def get(self, key):
+        digest = self.digest(key)
+        entry = self._get_local(key)
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = cache.get(TOKEN_CACHE_KEY.format(digest=digest))
+            if entry is not None:
+                self._store_local(key, entry)
+        if entry is not None:
+            if self.is_valid(digest, entry):
+                self.hits += 1
+                return self.restore(entry[0])
+            self._drop(key)
+        self.misses += 1
+        return None
+
+    def set(self, key, user):
+        entry = (self.snapshot(user), user.id, self.get_user_version(user.id))
+        self._store_local(key, entry)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(
+                TOKEN_CACHE_KEY.format(digest=self.digest(key)), entry,
+                settings.TOKEN_CACHE_SHARED_TTL
+            )
+
+    def _drop(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.delete_many([
+                TOKEN_CACHE_KEY.format(digest=self.digest(key))
+                for key in keys
+            ])
+
+    def invalidate(self, *keys):
+        """Отзывает токены во всех процессах"""
+        cache.set_many(
+            {
+                TOKEN_REVOKED_KEY.format(digest=self.digest(key)): True
+                for key in keys
+            },
+            self.marks_timeout()
+        )
+        self._drop(*keys)
+
+    def invalidate_user(self, user_id):
+        """Меняет версию пользователя: все его снимки устаревают"""
+        cache.set(
+            USER_VERSION_KEY.format(user_id=user_id), uuid4().hex,
+            self.marks_timeout()
+        )
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries)
+        }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication с кешем снимков пользователей"""
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
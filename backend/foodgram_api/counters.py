@@ -0,0 +1,33 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from api.models import FavoriteRecipe, Recipe, ShoppingList, Subscription
+from users.models import FoodGramUser
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipe, 'favorite_recipe'),
+    (Recipe, 'in_cart_count', ShoppingList, 'shop_recipe'),
+    (FoodGramUser, 'recipes_count', Recipe, 'author'),
+    (FoodGramUser, 'followers_count', Subscription, 'following'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счетчик через F(), не опуская его ниже нуля"""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def actual_count(related_model, related_field):
+    """Подзапрос с настоящим количеством связанных строк"""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
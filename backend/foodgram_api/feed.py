@@ -0,0 +1,64 @@
+from itertools import islice
+
+from django.db.models import Exists, OuterRef
+
+from api.models import FeedEntry, Recipe, Subscription
+
+FEED_BATCH_SIZE = 1000
+
+
+def add_entries(pairs):
+    """Пачками добавляет записи (user_id, recipe_id) в ленты"""
+    pairs = iter(pairs)
+    while True:
+        chunk = list(islice(pairs, FEED_BATCH_SIZE))
+        if not chunk:
+            return
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in chunk
+            ],
+            ignore_conflicts=True
+        )
+
+
+def fan_out_recipe(recipe_id, author_id):
+    """Добавляет новый рецепт в ленты всех подписчиков автора"""
+    followers = Subscription.objects.filter(
+        following_id=author_id
+    ).values_list('followers_id', flat=True)
+    add_entries(
+        (user_id, recipe_id)
+        for user_id in followers.iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+
+
+def backfill_subscription(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные рецепты автора"""
+    recipes = Recipe.objects.filter(
+        author_id=author_id
+    ).values_list('id', flat=True)
+    add_entries(
+        (user_id, recipe_id)
+        for recipe_id in recipes.iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+
+
+def remove_subscription(user_id, author_id):
+    """Убирает рецепты автора из ленты отписавшегося пользователя"""
+    FeedEntry.objects.filter(
+        user_id=user_id,
+        recipe__author_id=author_id
+    ).delete()
+
+
+def remove_orphan_entries():
+    """Удаляет записи лент, для которых больше нет подписки"""
+    deleted, _ = FeedEntry.objects.exclude(
+        Exists(Subscription.objects.filter(
+            followers_id=OuterRef('user_id'),
+            following_id=OuterRef('recipe__author_id')
+        ))
+    ).delete()
+    return deleted
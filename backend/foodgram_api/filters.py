@@ -1,7 +1,32 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 
 from api.models import Ingredient, Recipe
 
+from .search import SEARCH_ORDERING, search_recipes
+from .tag_cache import tag_catalogue
+
+RECIPE_ORDERINGS = {
+    'new': ('-id', ),
+    'popular': ('-popularity', '-id'),
+    'quick': ('cooking_time', 'id'),
+}
+DEFAULT_RECIPE_ORDERING = 'new'
+
+
+def get_recipe_ordering(request):
+    """Поля сортировки рецептов по параметру ?ordering=.
+
+    При поиске без явной сортировки рецепты идут по релевантности.
+    """
+    params = request.query_params
+    if params.get('search') and not params.get('ordering'):
+        return SEARCH_ORDERING
+    return RECIPE_ORDERINGS.get(
+        params.get('ordering'),
+        RECIPE_ORDERINGS[DEFAULT_RECIPE_ORDERING]
+    )
+
 
 class RecipeFilter(django_filters.FilterSet):
     """Фильтр для рецептов"""
@@ -11,14 +36,24 @@ class RecipeFilter(django_filters.FilterSet):
     is_favorited = django_filters.NumberFilter(
         method='filter_is_favorited'
     )
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tags__slug',
-        lookup_expr='icontains'
+    tags = django_filters.MultipleChoiceFilter(
+        choices=tag_catalogue.get_choices,
+        method='filter_tags'
+    )
+    search = django_filters.CharFilter(
+        method='filter_search'
+    )
+    ordering = django_filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='filter_ordering'
     )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'tags')
+        fields = (
+            'author', 'is_favorited', 'is_in_shopping_cart', 'tags', 'search',
+            'ordering'
+        )
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -34,6 +69,21 @@ class RecipeFilter(django_filters.FilterSet):
             )
         return queryset
 
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, через EXISTS без DISTINCT"""
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=tag_catalogue.get_ids(value)
+        )))
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию"""
+        return search_recipes(queryset, value).order_by(*SEARCH_ORDERING)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка, для каждой из которых есть составной индекс"""
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
 
 class IngredientStartsWithFilter(django_filters.FilterSet):
     """Фильтр для ингредиентов"""
@@ -0,0 +1,241 @@
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from api.models import ImageJob, Recipe, recipe_image_storage
+
+from .recipe_cache import bump_recipe_versions
+from .response_cache import bump_generation
+
+VARIANTS_DIR = 'variants'
+UPLOAD_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+ERROR_MAX_LENGTH = 1000
+
+ClaimedJob = namedtuple('ClaimedJob', 'id recipe_id requested_at image')
+
+
+def get_formats():
+    """Форматы копий: ключ в ответе, формат Pillow, расширение, опции"""
+    return (
+        ('jpeg', 'JPEG', 'jpg', {
+            'quality': settings.IMAGE_JPEG_QUALITY,
+            'progressive': True,
+            'optimize': True,
+        }),
+        ('webp', 'WEBP', 'webp', {
+            'quality': settings.IMAGE_WEBP_QUALITY,
+            'method': 4,
+        }),
+    )
+
+
+def variants_dir(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{VARIANTS_DIR}/{stem}'
+
+
+def variant_name(name, variant, extension):
+    return f'{variants_dir(name)}/{variant}.{extension}'
+
+
+def flatten(image):
+    """RGB без прозрачности: прозрачные области заливаются белым"""
+    if image.mode == 'P':
+        image = image.convert('RGBA')
+    if image.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def inspect_image(file):
+    """Формат и размеры картинки по заголовку, без декодирования пикселей"""
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Загрузите корректную картинку.')
+    finally:
+        file.seek(0)
+    if image_format not in UPLOAD_FORMATS:
+        raise ValidationError(
+            f'Формат {image_format} не поддерживается, допустимы '
+            f'{", ".join(UPLOAD_FORMATS)}.'
+        )
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Картинка {width}x{height} слишком большая, допустимо не более '
+            f'{settings.IMAGE_MAX_PIXELS} пикселей.'
+        )
+    return UPLOAD_FORMATS[image_format]
+
+
+def render_variants(name):
+    """Сохраняет уменьшенные копии картинки во всех форматах.
+
+    Выполняется в отдельном процессе без обращений к БД. Копии
+    считаются от большей к меньшей, каждая следующая уменьшается из
+    предыдущей, а JPEG сразу декодируется в уменьшенном масштабе.
+    """
+    sizes = sorted(
+        settings.IMAGE_VARIANTS.items(), key=lambda item: -item[1]
+    )
+    largest = sizes[0][1]
+    with recipe_image_storage().open(name) as file:
+        image = Image.open(file)
+        image.draft('RGB', (largest, largest))
+        image = flatten(ImageOps.exif_transpose(image))
+    variants = {}
+    for variant, size in sizes:
+        image.thumbnail((size, size), Image.LANCZOS)
+        variants[variant] = {'width': image.width, 'height': image.height}
+        for key, image_format, extension, options in get_formats():
+            buffer = BytesIO()
+            image.save(buffer, image_format, **options)
+            target = variant_name(name, variant, extension)
+            default_storage.delete(target)
+            variants[variant][key] = default_storage.save(
+                target, ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def enqueue_image(recipe):
+    """Ставит картинку рецепта в очередь, если копии сделаны не с нее.
+
+    Если та же картинка уже обработана для другого рецепта, копии
+    берутся оттуда без очереди. Старые копии сразу убираются из
+    рецепта, до готовности новых отдается только оригинал.
+    """
+    name = recipe.image.name
+    if recipe.image_variants.get('source') == name:
+        return
+    ready = Recipe.objects.filter(
+        image=name, image_variants__source=name
+    ).exclude(pk=recipe.id).values_list('image_variants', flat=True).first()
+    if ready:
+        recipe.image_variants = ready
+        Recipe.objects.filter(pk=recipe.id).update(image_variants=ready)
+        return
+    ImageJob.objects.update_or_create(
+        recipe_id=recipe.id,
+        defaults={'requested_at': timezone.now(), 'attempts': 0, 'error': ''}
+    )
+    if recipe.image_variants:
+        recipe.image_variants = {}
+        Recipe.objects.filter(pk=recipe.id).update(image_variants={})
+
+
+@transaction.atomic
+def claim_jobs(limit):
+    """Забирает задачи из очереди на IMAGE_JOB_LOCK_TIMEOUT секунд.
+
+    Строки, занятые другим обработчиком, пропускаются, так что
+    обработчиков можно запускать несколько.
+    """
+    now = timezone.now()
+    rows = list(
+        ImageJob.objects.select_for_update(skip_locked=True).filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+            attempts__lt=settings.IMAGE_JOB_MAX_ATTEMPTS
+        ).values_list('id', 'recipe_id', 'requested_at')[:limit]
+    )
+    if not rows:
+        return []
+    ImageJob.objects.filter(id__in=[row[0] for row in rows]).update(
+        locked_until=now + timezone.timedelta(
+            seconds=settings.IMAGE_JOB_LOCK_TIMEOUT
+        ),
+        attempts=F('attempts') + 1
+    )
+    images = dict(Recipe.objects.filter(
+        id__in=[row[1] for row in rows]
+    ).values_list('id', 'image'))
+    return [
+        ClaimedJob(*row, images[row[1]]) for row in rows if row[1] in images
+    ]
+
+
+@transaction.atomic
+def complete_job(job, variants):
+    """Сохраняет копии в рецепт, если картинка за это время не сменилась"""
+    updated = Recipe.objects.filter(pk=job.recipe_id, image=job.image).update(
+        image_variants={'source': job.image, 'sizes': variants}
+    )
+    deleted, _ = ImageJob.objects.filter(
+        pk=job.id, requested_at=job.requested_at
+    ).delete()
+    if not deleted:
+        ImageJob.objects.filter(pk=job.id).update(locked_until=None)
+    if updated:
+        transaction.on_commit(lambda: bump_recipe_versions(job.recipe_id))
+        transaction.on_commit(bump_generation)
+
+
+def fail_job(job, error):
+    ImageJob.objects.filter(pk=job.id).update(
+        locked_until=None, error=str(error)[:ERROR_MAX_LENGTH]
+    )
+
+
+def release_images(*names):
+    """Удаляет файлы картинок и их копии, если на них больше не ссылается
+    ни один рецепт.
+
+    Проверка ссылок идет без блокировок, поэтому файлы, которые
+    сохранялись или повторно загружались за последние
+    IMAGE_RELEASE_GRACE секунд, не удаляются: их может ждать еще
+    не закоммиченный рецепт. Такие файлы потом удаляет collect_images.
+    """
+    names = set(filter(None, names))
+    if not names:
+        return
+    used = set(Recipe.objects.filter(image__in=names).values_list(
+        'image', flat=True
+    ))
+    storage = recipe_image_storage()
+    for name in names - used:
+        if storage.is_recent(name, settings.IMAGE_RELEASE_GRACE):
+            continue
+        storage.delete(name)
+        remove_variants(name)
+
+
+def remove_variants(name):
+    directory = variants_dir(name)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for file in files:
+        default_storage.delete(f'{directory}/{file}')
+    try:
+        os.rmdir(default_storage.path(directory))
+    except OSError:
+        pass
+
+
+def get_srcset(variants, request):
+    """Строки srcset по форматам: {'webp': 'url 160w, url 480w', ...}"""
+    by_width = {}
+    for item in (variants or {}).get('sizes', {}).values():
+        by_width.setdefault(item['width'], item)
+    srcset = {}
+    for width, item in sorted(by_width.items()):
+        for key, *_ in get_formats():
+            url = default_storage.url(item[key])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            srcset.setdefault(key, []).append(f'{url} {width}w')
+    return {key: ', '.join(items) for key, items in srcset.items()}
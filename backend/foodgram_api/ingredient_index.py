@@ -0,0 +1,96 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.models import Ingredient
+
+INGREDIENT_INDEX_VERSION_KEY = 'ingredient_index_version'
+SEPARATOR = '\n'
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по префиксу.
+
+    Хранит отсортированный по casefold-названию список ингредиентов,
+    загружается при первом запросе и сбрасывается сигналами модели.
+    Другие процессы узнают о сбросе по версии в общем кеше, которую
+    проверяют не чаще раза в INGREDIENT_INDEX_CHECK_INTERVAL секунд.
+
+    Загруженный индекс - один кортеж (ключи, ингредиенты, текст для
+    поиска по подстроке, смещения ключей в тексте), который заменяется
+    целиком, поэтому поиск без блокировки всегда видит согласованный
+    снимок.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._checked_at = 0
+
+    def invalidate(self):
+        cache.set(INGREDIENT_INDEX_VERSION_KEY, uuid4().hex, timeout=None)
+        with self._lock:
+            self._checked_at = 0
+
+    def _shared_version(self):
+        return cache.get(INGREDIENT_INDEX_VERSION_KEY)
+
+    def _load(self):
+        ingredients = sorted(
+            (name.casefold(), name, measurement_unit, pk)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [ingredient[0] for ingredient in ingredients]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, measurement_unit, pk in ingredients
+        ]
+        offsets = list(accumulate((len(key) + 1 for key in keys), initial=0))
+        self._index = (keys, items, SEPARATOR.join(keys), offsets)
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if (self._index is not None and now - self._checked_at
+                < settings.INGREDIENT_INDEX_CHECK_INTERVAL):
+            return self._index
+        with self._lock:
+            version = self._shared_version()
+            if self._index is None or version != self._version:
+                self._load()
+                self._version = version
+            self._checked_at = now
+            return self._index
+
+    def search(self, query, limit=None):
+        """Точные совпадения, затем совпадения по префиксу, затем по
+        подстроке, в каждой группе по алфавиту, не больше limit
+        (по умолчанию INGREDIENT_SEARCH_LIMIT)."""
+        keys, items, text, offsets = self._ensure_loaded()
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\U0010ffff', start)
+        exact = [items[i] for i in range(start, end) if keys[i] == query]
+        prefix = [items[i] for i in range(start, end) if keys[i] != query]
+        results = (exact + prefix)[:limit]
+        if len(results) == limit or not query or SEPARATOR in query:
+            return results
+        position = text.find(query)
+        while position != -1 and len(results) < limit:
+            i = bisect_right(offsets, position) - 1
+            if not start <= i < end:
+                results.append(items[i])
+            position = text.find(query, offsets[i + 1])
+        return results
+
+
+ingredient_index = IngredientIndex()
@@ -1,16 +1,160 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
 from api.models import Ingredient
-from django.core.management.base import BaseCommand
+from foodgram_api.ingredient_index import ingredient_index
+
+DEFAULT_PATH = Path(settings.BASE_DIR) / 'static' / 'data' / 'ingredients.csv'
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.DictReader(file):
+        yield row['name'], row['measurement_unit']
+
+
+def read_json(file):
+    """Потоково читает json-массив обьектов, не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался json-массив ингредиентов')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield row['name'], row['measurement_unit']
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer.strip():
+                raise CommandError('Файл json обрывается посередине')
+            return
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def unique_rows(rows):
+    seen = set()
+    for name, measurement_unit in rows:
+        key = (name.strip(), measurement_unit.strip())
+        if key not in seen:
+            seen.add(key)
+            yield key
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
 
 
 class Command(BaseCommand):
-    help = 'Заполняет БД ингредиентами'
+    help = 'Заполняет БД ингредиентами из csv или json файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=DEFAULT_PATH,
+            type=Path,
+            help='Путь к csv или json файлу с ингредиентами'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            default=5000,
+            type=int,
+            help='Количество строк, записываемых за один запрос'
+        )
+        parser.add_argument(
+            '--method',
+            choices=('bulk', 'copy'),
+            default='bulk',
+            help='bulk_create или COPY во временную таблицу (PostgreSQL)'
+        )
 
     def handle(self, *args, **options):
-        for row in csv.DictReader(open('static/data/ingredients.csv',
-                                       encoding='UTF-8')):
-            Ingredient.objects.get_or_create(
-                name=row['name'],
-                measurement_unit=row['measurement_unit']
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден')
+        if options['method'] == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('COPY доступен только для PostgreSQL')
+        load = getattr(self, f'load_{options["method"]}')
+        started = time.monotonic()
+        count_before = Ingredient.objects.count()
+        rows = 0
+        with open(path, encoding='UTF-8') as file, transaction.atomic():
+            for chunk in chunked(unique_rows(reader(file)),
+                                 options['chunk_size']):
+                load(chunk)
+                rows += len(chunk)
+        transaction.on_commit(ingredient_index.invalidate)
+        elapsed = time.monotonic() - started
+        created = Ingredient.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Уникальных строк: {rows}, добавлено: {created}, '
+            f'{rows / elapsed if elapsed else rows:.0f} строк/с'
+        ))
+
+    @staticmethod
+    def load_bulk(chunk):
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in chunk
+            ],
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def load_copy(chunk):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(chunk)
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS ingredient_staging '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_staging '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
             )
+            cursor.execute('TRUNCATE ingredient_staging')
@@ -0,0 +1,99 @@
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+
+from foodgram_api.recipe_index import RecipeIngredientIndex
+
+
+def ingredient_sampler(ingredients, rng):
+    """Выбор ингредиентов по закону Ципфа: популярные встречаются чаще"""
+    population = range(1, ingredients + 1)
+    cum_weights = list(accumulate(1 / rank for rank in population))
+
+    def sample(size):
+        return set(rng.choices(population, cum_weights=cum_weights, k=size))
+    return sample
+
+
+def generate_rows(recipes, per_recipe, sample, rng):
+    """Пары (recipe_id, ingredient_id) синтетических рецептов"""
+    for recipe_id in range(1, recipes + 1):
+        size = rng.randint(max(per_recipe // 2, 1), per_recipe * 3 // 2)
+        for ingredient_id in sample(size):
+            yield recipe_id, ingredient_id
+
+
+class Command(BaseCommand):
+    help = ('Замеряет построение индекса рецептов по ингредиентам и поиск '
+            'на синтетических данных, без обращений к БД')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument(
+            '--per-recipe',
+            type=int,
+            default=8,
+            help='Среднее количество ингредиентов в рецепте'
+        )
+        parser.add_argument(
+            '--have',
+            type=int,
+            default=15,
+            help='Количество ингредиентов в запросе'
+        )
+        parser.add_argument('--missing', type=int, default=1)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--updates', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sample = ingredient_sampler(options['ingredients'], rng)
+        index = RecipeIngredientIndex(shared=False)
+        started = time.perf_counter()
+        index.build(generate_rows(
+            options['recipes'], options['per_recipe'], sample, rng
+        ))
+        self.stdout.write(
+            f'Построение: {time.perf_counter() - started:.1f} с '
+            '(вместе с генерацией данных)'
+        )
+        stats = index.stats()
+        self.stdout.write(
+            f'Рецептов: {stats["recipes"]}, ингредиентов: '
+            f'{stats["ingredients"]}, '
+            f'память: {stats["bytes"] / 1024 / 1024:.1f} МБ'
+        )
+
+        timings, found = [], []
+        for _ in range(options['queries']):
+            have = sample(options['have'])
+            started = time.perf_counter()
+            found.append(len(index.search(have, options['missing'])))
+            timings.append(time.perf_counter() - started)
+        self.report('Поиск', timings)
+        self.stdout.write(
+            f'Найдено рецептов: медиана {statistics.median(found):.0f}, '
+            f'максимум {max(found)}'
+        )
+
+        timings = []
+        for _ in range(options['updates']):
+            recipe_id = rng.randint(1, options['recipes'])
+            new = sample(options['per_recipe'])
+            started = time.perf_counter()
+            index.set_recipe(recipe_id, new)
+            timings.append(time.perf_counter() - started)
+        self.report('Обновление рецепта', timings)
+
+    def report(self, title, timings):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{title}: медиана {statistics.median(timings) * 1000:.2f} мс, '
+            f'p95 {p95 * 1000:.2f} мс, максимум {timings[-1] * 1000:.2f} мс'
+        )
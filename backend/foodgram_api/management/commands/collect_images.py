@@ -0,0 +1,66 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Recipe, recipe_image_storage
+from foodgram_api.images import (VARIANTS_DIR, release_images, remove_variants,
+                                 variants_dir)
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки рецептов со случайными именами в хранилище '
+            'по хешу содержимого и удаляет файлы, на которые не ссылается '
+            'ни один рецепт')
+
+    def handle(self, *args, **options):
+        storage = recipe_image_storage()
+        moved = self.move_legacy(storage)
+        candidates = [
+            name for name in self.walk(storage, '')
+            if not name.startswith(f'{VARIANTS_DIR}/')
+            and not name.endswith('.part')
+        ]
+        before = len(candidates)
+        release_images(*candidates)
+        removed = before - sum(storage.exists(name) for name in candidates)
+        used = {
+            variants_dir(name) for name in Recipe.objects.values_list(
+                'image', flat=True
+            )
+        }
+        stems = []
+        if default_storage.exists(VARIANTS_DIR):
+            stems, _ = default_storage.listdir(VARIANTS_DIR)
+        for stem in stems:
+            if f'{VARIANTS_DIR}/{stem}' not in used:
+                remove_variants(stem)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {moved}, удалено лишних файлов: {removed}'
+        ))
+
+    def move_legacy(self, storage):
+        names = Recipe.objects.order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        moved = 0
+        for name in list(names):
+            if not name or storage.is_hashed(name) or not storage.exists(name):
+                continue
+            with storage.open(name) as file:
+                hashed = storage.save(name, file)
+            with transaction.atomic():
+                for recipe in Recipe.objects.filter(image=name):
+                    recipe.image = hashed
+                    recipe.save(update_fields=['image'])
+            moved += 1
+        return moved
+
+    def walk(self, storage, directory):
+        """Все файлы хранилища, включая вложенные каталоги"""
+        directories, files = storage.listdir(directory)
+        prefix = f'{directory}/' if directory else ''
+        for file in files:
+            yield prefix + file
+        for name in directories:
+            if prefix + name != VARIANTS_DIR:
+                yield from self.walk(storage, prefix + name)
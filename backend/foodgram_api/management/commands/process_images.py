@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from foodgram_api.images import (claim_jobs, complete_job, fail_job,
+                                 render_variants)
+
+
+def run_inline(function, *args):
+    """Выполняет функцию в текущем процессе, возвращая Future"""
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+class Command(BaseCommand):
+    help = ('Обработчик очереди картинок: делает уменьшенные копии '
+            'в JPEG и WebP в пуле процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.IMAGE_WORKER_PROCESSES,
+            help='Размер пула, 1 - обработка в текущем процессе'
+        )
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        executor = None
+        if options['processes'] > 1:
+            executor = ProcessPoolExecutor(options['processes'])
+        submit = executor.submit if executor else run_inline
+        processed = failed = 0
+        try:
+            while True:
+                close_old_connections()
+                jobs = claim_jobs(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                futures = [
+                    (job, submit(render_variants, job.image)) for job in jobs
+                ]
+                for job, future in futures:
+                    try:
+                        variants = future.result()
+                    except Exception as error:
+                        fail_job(job, error)
+                        failed += 1
+                        self.stderr.write(
+                            f'Рецепт {job.recipe_id}: {error}'
+                        )
+                    else:
+                        complete_job(job, variants)
+                        processed += 1
+        finally:
+            if executor:
+                executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок обработано: {processed}, с ошибкой: {failed}'
+        ))
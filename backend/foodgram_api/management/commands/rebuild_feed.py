@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Subscription
+from foodgram_api.feed import backfill_subscription, remove_orphan_entries
+
+
+class Command(BaseCommand):
+    help = ('Заполняет ленты подписок по существующим подпискам и удаляет '
+            'записи без подписки (после включения FEED_TIMELINE_ENABLED)')
+
+    def handle(self, *args, **options):
+        subscriptions = Subscription.objects.order_by('id').values_list(
+            'followers_id', 'following_id'
+        )
+        count = 0
+        for user_id, author_id in subscriptions.iterator():
+            with transaction.atomic():
+                backfill_subscription(user_id, author_id)
+            count += 1
+        removed = remove_orphan_entries()
+        self.stdout.write(self.style.SUCCESS(
+            f'Подписок обработано: {count}, лишних записей удалено: {removed}'
+        ))
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import ShoppingList, ShoppingListIngredient
+from foodgram_api.shopping_cart import (bump_cart_version, compute_cart_totals,
+                                        get_stored_cart_totals)
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает агрегированные списки покупок '
+            'и проверяет их на расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество пользователей в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(ShoppingList.objects.values_list('user_id', flat=True))
+            | set(ShoppingListIngredient.objects.values_list(
+                'user_id', flat=True
+            ))
+        )
+        batch_size = options['batch_size']
+        drifted_users = set()
+        drifted_rows = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            with transaction.atomic():
+                expected = compute_cart_totals(batch)
+                stored = get_stored_cart_totals(batch)
+                drift = {
+                    key for key in expected.keys() | stored.keys()
+                    if expected.get(key) != stored.get(key)
+                }
+                if not drift:
+                    continue
+                drifted_rows += len(drift)
+                users = {user_id for user_id, _ in drift}
+                drifted_users |= users
+                if options['check']:
+                    continue
+                self.rebuild(users, expected)
+                transaction.on_commit(
+                    lambda users=users: bump_cart_version(*users)
+                )
+        action = 'найдено' if options['check'] else 'исправлено'
+        self.stdout.write(
+            f'Пользователей: {len(user_ids)}, '
+            f'{action} расхождений: {drifted_rows} '
+            f'у {len(drifted_users)} пользователей'
+        )
+        if options['check'] and drifted_rows:
+            raise SystemExit(1)
+
+    @staticmethod
+    def rebuild(user_ids, expected):
+        ShoppingListIngredient.objects.filter(user_id__in=user_ids).delete()
+        ShoppingListIngredient.objects.bulk_create(
+            ShoppingListIngredient(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=amount,
+                recipes_count=recipes_count
+            )
+            for (user_id, ingredient_id), (amount, recipes_count)
+            in expected.items() if user_id in user_ids
+        )
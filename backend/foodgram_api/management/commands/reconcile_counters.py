@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from foodgram_api.counters import COUNTERS, actual_count
+
+
+class Command(BaseCommand):
+    help = 'Сверяет и исправляет денормализованные счетчики'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_drift = 0
+        for model, field, related_model, related_field in COUNTERS:
+            ids = list(model.objects.order_by('pk').values_list(
+                'pk', flat=True
+            ))
+            drift = 0
+            for start in range(0, len(ids), batch_size):
+                with transaction.atomic():
+                    drifted = list(model.objects.filter(
+                        pk__in=ids[start:start + batch_size]
+                    ).annotate(
+                        actual=actual_count(related_model, related_field)
+                    ).exclude(**{field: F('actual')}).values_list(
+                        'pk', flat=True
+                    ))
+                    drift += len(drifted)
+                    if options['check'] or not drifted:
+                        continue
+                    model.objects.filter(pk__in=drifted).update(
+                        **{field: actual_count(related_model, related_field)}
+                    )
+            total_drift += drift
+            self.stdout.write(
+                f'{model.__name__}.{field}: расхождений {drift}'
+            )
+        if options['check'] and total_drift:
+            raise SystemExit(1)
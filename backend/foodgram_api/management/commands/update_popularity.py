@@ -0,0 +1,59 @@
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import FavoriteRecipe, Recipe
+from foodgram_api.response_cache import bump_generation
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает популярность рецептов по добавлениям в избранное '
+            'с экспоненциальным затуханием (запускать периодически)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--half-life',
+            type=float,
+            default=settings.POPULARITY_HALF_LIFE_DAYS,
+            help='Период полураспада веса добавления в днях'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном запросе'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        decay = math.log(2) / (options['half_life'] * 24 * 60 * 60)
+        now = timezone.now()
+        scores = defaultdict(float)
+        favorites = FavoriteRecipe.objects.order_by().values_list(
+            'favorite_recipe_id', 'created'
+        )
+        for recipe_id, created in favorites.iterator(chunk_size=batch_size):
+            age = max((now - created).total_seconds(), 0)
+            scores[recipe_id] += math.exp(-decay * age)
+        for recipe_id in Recipe.objects.filter(
+            popularity__gt=0
+        ).values_list('pk', flat=True).iterator(chunk_size=batch_size):
+            scores.setdefault(recipe_id, 0)
+        recipes = [
+            Recipe(pk=recipe_id, popularity=score)
+            for recipe_id, score in scores.items()
+        ]
+        for start in range(0, len(recipes), batch_size):
+            with transaction.atomic():
+                Recipe.objects.bulk_update(
+                    recipes[start:start + batch_size], ['popularity']
+                )
+        if recipes:
+            bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярность пересчитана для {len(recipes)} рецептов'
+        ))
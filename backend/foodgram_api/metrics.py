@@ -0,0 +1,387 @@
+import glob
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+from api.models import ImageJob
+
+from .authentication import token_cache
+from .recipe_index import recipe_index
+
+COUNTER, GAUGE, HISTOGRAM = 'counter', 'gauge', 'histogram'
+LIVESUM, LIVEMAX = 'livesum', 'livemax'
+ARCHIVE = 'archive'
+
+METRICS = {
+    'foodgram_http_requests_total': (
+        COUNTER, 'Количество запросов по маршруту, методу и статусу'
+    ),
+    'foodgram_http_request_duration_seconds': (
+        HISTOGRAM, 'Время обработки запроса по маршруту и методу'
+    ),
+    'foodgram_http_requests_in_flight': (
+        GAUGE, 'Запросы, которые обрабатываются сейчас', LIVESUM
+    ),
+    'foodgram_db_queries_total': (
+        COUNTER, 'Количество запросов к БД по маршруту и методу'
+    ),
+    'foodgram_db_query_duration_seconds_total': (
+        COUNTER, 'Суммарное время запросов к БД по маршруту и методу'
+    ),
+    'foodgram_response_cache_requests_total': (
+        COUNTER, 'Обращения к кешу ответов для анонимных пользователей'
+    ),
+    'foodgram_token_cache_requests_total': (
+        COUNTER, 'Обращения к кешу токенов в памяти процессов'
+    ),
+    'foodgram_recipe_index_recipes': (
+        GAUGE, 'Рецептов в индексе по ингредиентам', LIVEMAX
+    ),
+    'foodgram_recipe_index_bytes': (
+        GAUGE, 'Память индекса рецептов в одном процессе', LIVEMAX
+    ),
+}
+QUEUE_METRICS = {
+    'foodgram_image_jobs': 'Задачи обработки картинок в очереди',
+}
+
+HEADER = struct.Struct('<q')
+KEY_LENGTH = struct.Struct('<i')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 1 << 16
+
+
+class MmapedValues:
+    """Значения метрик одного процесса в файле, отображенном в память.
+
+    Файл пишет только процесс-владелец, остальные процессы его читают.
+    Запись - ключ переменной длины и double, выровненный по 8 байт,
+    в начале файла - размер занятой части.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self._capacity = size
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._used = HEADER.unpack_from(self._mmap, 0)[0] or HEADER.size
+        self._positions = {
+            key: position
+            for key, _, position in self.entries(self._mmap, self._used)
+        }
+
+    @staticmethod
+    def entries(data, used):
+        position = HEADER.size
+        while position < used:
+            length = KEY_LENGTH.unpack_from(data, position)[0]
+            position += KEY_LENGTH.size
+            key = bytes(data[position:position + length]).decode()
+            position += length + (-(KEY_LENGTH.size + length) % 8)
+            yield key, VALUE.unpack_from(data, position)[0], position
+            position += VALUE.size
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        used = HEADER.unpack_from(data, 0)[0] if len(data) >= 8 else 0
+        return {key: value for key, value, _ in cls.entries(data, used)}
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is not None:
+            return position
+        encoded = key.encode()
+        padding = -(KEY_LENGTH.size + len(encoded)) % 8
+        needed = KEY_LENGTH.size + len(encoded) + padding + VALUE.size
+        while self._used + needed > self._capacity:
+            self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._mmap.resize(self._capacity)
+        position = self._used
+        KEY_LENGTH.pack_into(self._mmap, position, len(encoded))
+        start = position + KEY_LENGTH.size
+        self._mmap[start:start + len(encoded)] = encoded
+        position = start + len(encoded) + padding
+        VALUE.pack_into(self._mmap, position, 0.0)
+        self._used = position + VALUE.size
+        HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def add(self, key, amount):
+        position = self._position(key)
+        value = VALUE.unpack_from(self._mmap, position)[0]
+        VALUE.pack_into(self._mmap, position, value + amount)
+
+    def set(self, key, value):
+        VALUE.pack_into(self._mmap, self._position(key), value)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def get_key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class MultiProcessRegistry:
+    """Метрики всех процессов через файлы в METRICS_DIR.
+
+    Каждый процесс пишет свои файлы counter_<pid>.db и gauge_<pid>.db,
+    при выгрузке файлы всех процессов складываются, поэтому любой
+    воркер gunicorn отдает сумму по всей группе процессов. Счетчики
+    завершившихся процессов переносятся в counter_archive.db, их gauge
+    удаляются, см. mark_process_dead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._files = {}
+
+    def _values(self, kind):
+        pid = os.getpid()
+        if pid != self._pid:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            self._pid, self._files = pid, {}
+        if kind not in self._files:
+            self._files[kind] = MmapedValues(
+                os.path.join(settings.METRICS_DIR, f'{kind}_{pid}.db')
+            )
+        return self._files[kind]
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._values(COUNTER).add(get_key(name, labels), amount)
+
+    def set_counter(self, name, labels, value):
+        """Счетчик, который процесс ведет сам, например hits кеша"""
+        with self._lock:
+            self._values(COUNTER).set(get_key(name, labels), value)
+
+    def add_gauge(self, name, labels, amount):
+        with self._lock:
+            self._values(GAUGE).add(get_key(name, labels), amount)
+
+    def set_gauge(self, name, labels, value):
+        with self._lock:
+            self._values(GAUGE).set(get_key(name, labels), value)
+
+    def observe(self, name, labels, value):
+        bucket = next(
+            (str(le) for le in settings.METRICS_BUCKETS if value <= le),
+            '+Inf'
+        )
+        with self._lock:
+            values = self._values(COUNTER)
+            values.add(get_key(f'{name}_bucket', {**labels, 'le': bucket}), 1)
+            values.add(get_key(f'{name}_sum', labels), value)
+            values.add(get_key(f'{name}_count', labels), 1)
+
+    def collect(self):
+        """Суммы значений по всем процессам: {ключ: значение}"""
+        totals = defaultdict(float)
+        gauges = defaultdict(list)
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+            kind, pid = os.path.basename(path)[:-3].split('_')
+            if kind == GAUGE and not is_alive(int(pid)):
+                continue
+            for key, value in MmapedValues.read(path).items():
+                if kind == GAUGE:
+                    gauges[key].append(value)
+                else:
+                    totals[key] += value
+        for key, values in gauges.items():
+            name = json.loads(key)[0]
+            mode = METRICS[name][2]
+            totals[key] = max(values) if mode == LIVEMAX else sum(values)
+        return totals
+
+
+def clear_metrics():
+    """Удаляет файлы прошлого запуска, до старта воркеров gunicorn"""
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        os.remove(path)
+
+
+def mark_process_dead(pid):
+    """Убирает gauge завершившегося воркера, а его счетчики добавляет
+    в общий файл counter_archive.db, чтобы файлы не копились.
+
+    Вызывается из хука gunicorn child_exit в главном процессе.
+    """
+    directory = settings.METRICS_DIR
+    try:
+        os.remove(os.path.join(directory, f'{GAUGE}_{pid}.db'))
+    except FileNotFoundError:
+        pass
+    counters = os.path.join(directory, f'{COUNTER}_{pid}.db')
+    if not os.path.exists(counters):
+        return
+    archive = os.path.join(directory, f'{COUNTER}_{ARCHIVE}.db')
+    merged = os.path.join(directory, f'{ARCHIVE}.tmp')
+    if os.path.exists(archive):
+        shutil.copyfile(archive, merged)
+    values = MmapedValues(merged)
+    for key, value in MmapedValues.read(counters).items():
+        values.add(key, value)
+    values.close()
+    os.replace(merged, archive)
+    os.remove(counters)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = MultiProcessRegistry()
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for name, value in labels
+    ) + '}'
+
+
+def render_histogram(name, samples):
+    """Накопительные бакеты, _sum и _count гистограммы"""
+    lines = []
+    series = defaultdict(dict)
+    for metric, labels, value in samples:
+        labels = dict(labels)
+        le = labels.pop('le', None)
+        series[tuple(sorted(labels.items()))][(metric, le)] = value
+    for labels, values in sorted(series.items()):
+        total = 0
+        for le in [*map(str, settings.METRICS_BUCKETS), '+Inf']:
+            total += values.get((f'{name}_bucket', le), 0)
+            lines.append(
+                f'{name}_bucket{format_labels([*labels, ("le", le)])} {total}'
+            )
+        for suffix in ('_sum', '_count'):
+            value = values.get((f'{name}{suffix}', None), 0)
+            lines.append(f'{name}{suffix}{format_labels(labels)} {value}')
+    return lines
+
+
+def render_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    if recipe_index.loaded:
+        stats = recipe_index.stats()
+        registry.set_gauge(
+            'foodgram_recipe_index_recipes', {}, stats['recipes']
+        )
+        registry.set_gauge('foodgram_recipe_index_bytes', {}, stats['bytes'])
+    by_name = defaultdict(list)
+    for key, value in registry.collect().items():
+        metric, labels = json.loads(key)
+        name = metric
+        for suffix in ('_bucket', '_sum', '_count'):
+            if metric.endswith(suffix) and metric[:-len(suffix)] in METRICS:
+                name = metric[:-len(suffix)]
+        by_name[name].append((metric, labels, value))
+    lines = []
+    for name, (kind, description, *_) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        if kind == HISTOGRAM:
+            lines += render_histogram(name, by_name[name])
+            continue
+        lines += [
+            f'{metric}{format_labels(labels)} {value}'
+            for metric, labels, value in sorted(by_name[name])
+        ]
+    for name, description in QUEUE_METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge']
+    failed = ImageJob.objects.filter(
+        attempts__gte=settings.IMAGE_JOB_MAX_ATTEMPTS
+    ).count()
+    pending = ImageJob.objects.count() - failed
+    lines += [
+        f'foodgram_image_jobs{{state="pending"}} {pending}',
+        f'foodgram_image_jobs{{state="failed"}} {failed}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Внутренний эндпоинт для Prometheus, через nginx не доступен"""
+    return HttpResponse(
+        render_metrics(), content_type='text/plain; version=0.0.4'
+    )
+
+
+class MetricsMiddleware:
+    """Собирает метрики запросов в общий для процессов реестр"""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        in_flight = 'foodgram_http_requests_in_flight'
+        registry.add_gauge(in_flight, {}, 1)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            registry.add_gauge(in_flight, {}, -1)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        labels = {
+            'route': match.view_name if match else 'unmatched',
+            'method': request.method,
+        }
+        registry.observe(
+            'foodgram_http_request_duration_seconds', labels, duration
+        )
+        registry.inc(
+            'foodgram_http_requests_total',
+            {**labels, 'status': str(response.status_code)}
+        )
+        timing = getattr(response, 'timing', None)
+        if timing is not None:
+            registry.inc('foodgram_db_queries_total', labels, timing.queries)
+            registry.inc(
+                'foodgram_db_query_duration_seconds_total',
+                labels, timing.db_time
+            )
+        if response.has_header('X-Cache'):
+            registry.inc(
+                'foodgram_response_cache_requests_total',
+                {'result': response['X-Cache'].lower()}
+            )
+        for result, value in (('hit', token_cache.hits),
+                              ('miss', token_cache.misses)):
+            registry.set_counter(
+                'foodgram_token_cache_requests_total',
+                {'result': result}, value
+            )
+        return response
@@ -1,4 +1,5 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPagination(PageNumberPagination):
@@ -6,3 +7,68 @@ class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'page_size'
     max_page_size = 10
+
+
+class CustomCursorPagination(CursorPagination):
+    """Курсорный пагинатор по -id без подсчета COUNT(*)"""
+    page_size = 6
+    page_size_query_param = 'page_size'
+    max_page_size = 10
+    ordering = '-id'
+    stable_fields = ('id', )
+
+    def get_ordering(self, request, queryset, view):
+        """Сортировка из представления, если оно ее задает.
+
+        Позиция курсора берется из первого поля сортировки. Если оно
+        меняется (популярность, время приготовления, релевантность
+        поиска), рецепты пропускаются или повторяются между страницами,
+        поэтому такие сортировки курсором не листаются.
+        """
+        get_ordering = getattr(view, 'get_ordering', None)
+        if get_ordering is None:
+            return super().get_ordering(request, queryset, view)
+        ordering = tuple(get_ordering())
+        if ordering[0].lstrip('-') not in self.stable_fields:
+            raise ValidationError({
+                'pagination': 'Курсорная пагинация доступна только '
+                              'для сортировки по новизне'
+            })
+        return ordering
+
+
+class FeedCursorPagination(CustomCursorPagination):
+    """Курсорный пагинатор ленты подписок с заданной сортировкой"""
+
+    def __init__(self, ordering='-id'):
+        self.ordering = ordering
+
+    def get_ordering(self, request, queryset, view):
+        return (self.ordering, )
+
+
+class CursorPaginationMixin:
+    """Миксин для включения курсорной пагинации по запросу.
+
+    Курсорная пагинация включается параметром ?pagination=cursor
+    (или наличием ?cursor=) для действий из cursor_pagination_actions,
+    в остальных случаях используется pagination_class.
+    """
+    cursor_pagination_class = CustomCursorPagination
+    cursor_pagination_actions = ()
+
+    def use_cursor_pagination(self):
+        params = self.request.query_params
+        return self.action in self.cursor_pagination_actions and (
+            params.get('pagination') == 'cursor'
+            or CustomCursorPagination.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.use_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+            else:
+                return super().paginator
+        return self._paginator
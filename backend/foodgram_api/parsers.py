@@ -0,0 +1,55 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """multipart/form-data с картинкой файлом. Остальные поля рецепта
+    передаются одной JSON-строкой в поле data или обычными полями формы:
+    теги повторением поля (tags=1, tags=2), ингредиенты JSON-строкой
+    или полями вида ingredients[0]id.
+
+    Файлы в этом случае попадают в request.data вместе с остальными
+    полями. Файлы сохраняются обработчиками загрузки Django из
+    FILE_UPLOAD_HANDLERS во временные файлы и в память целиком
+    не читаются.
+    """
+    json_list_fields = ('ingredients',)
+
+    def load_json(self, field, value):
+        try:
+            return json.loads(value)
+        except ValueError as error:
+            raise ParseError(
+                f'Поле {field} содержит некорректный JSON: {error}'
+            )
+
+    def parse_form(self, form):
+        """Раскладывает JSON-списки объектов в поля вида
+        ingredients[0]id, которые DRF разбирает сам"""
+        form = form.copy()
+        for field in self.json_list_fields:
+            if field not in form:
+                continue
+            items = self.load_json(field, form.pop(field)[-1])
+            if not isinstance(items, list) or not all(
+                    isinstance(item, dict) for item in items):
+                raise ParseError(
+                    f'Поле {field} должно содержать JSON-список объектов'
+                )
+            for index, item in enumerate(items):
+                for key, value in item.items():
+                    form[f'{field}[{index}]{key}'] = value
+        return form
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        if 'data' not in result.data:
+            return DataAndFiles(self.parse_form(result.data), result.files)
+        data = self.load_json('data', result.data['data'])
+        if not isinstance(data, dict):
+            raise ParseError('Поле data должно содержать JSON-объект')
+        data.update(result.files.dict())
+        return DataAndFiles(data, MultiValueDict())
@@ -0,0 +1,169 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404, HttpResponse
+from django.template.response import TemplateResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+
+from .authentication import CachedTokenAuthentication
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+PROFILE_NAME = re.compile(r'^[\w.-]+\.(prof|html)$')
+STATS_LIMIT = 60
+STATS_SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+
+def is_requested(request):
+    return (
+        request.headers.get(PROFILE_HEADER) == '1'
+        or request.GET.get(PROFILE_PARAM) == '1'
+    )
+
+
+def is_staff(request):
+    """Сотрудник по сессии или по токену API"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        result = CachedTokenAuthentication().authenticate(Request(request))
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def new_profile_name(request, duration, extension):
+    slug = re.sub(r'[^\w]+', '_', request.path).strip('_')[:60]
+    return (
+        f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid4().hex[:6]}-'
+        f'{request.method}-{duration * 1000:.0f}ms-{slug}.{extension}'
+    )
+
+
+def list_profiles():
+    """Сохраненные профили, новые первыми"""
+    if not os.path.isdir(settings.PROFILES_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(settings.PROFILES_DIR):
+        if PROFILE_NAME.match(entry.name):
+            stat = entry.stat()
+            profiles.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'modified': stat.st_mtime,
+            })
+    profiles.sort(key=lambda profile: profile['modified'], reverse=True)
+    return profiles
+
+
+def trim_profiles():
+    """Кольцевой буфер: удаляет самые старые профили сверх
+    PROFILES_MAX_COUNT"""
+    for profile in list_profiles()[settings.PROFILES_MAX_COUNT:]:
+        try:
+            os.remove(get_profile_path(profile['name']))
+        except FileNotFoundError:
+            pass
+
+
+def get_profile_path(name):
+    if not PROFILE_NAME.match(name):
+        raise Http404
+    return os.path.join(settings.PROFILES_DIR, name)
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос сотрудника с заголовком X-Profile: 1
+    или параметром ?profile=1.
+
+    Используется выборочный профилировщик pyinstrument, если он
+    установлен, иначе cProfile. Имя сохраненного профиля возвращается
+    в заголовке X-Profile-Id. Без PROFILING_ENABLED промежуточный слой
+    не подключается совсем.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_requested(request) or not is_staff(request):
+            return self.get_response(request)
+        os.makedirs(settings.PROFILES_DIR, exist_ok=True)
+        started = time.perf_counter()
+        if SamplingProfiler is not None:
+            profiler = SamplingProfiler()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+            name = new_profile_name(
+                request, time.perf_counter() - started, 'html'
+            )
+            with open(get_profile_path(name), 'w') as file:
+                file.write(profiler.output_html())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            name = new_profile_name(
+                request, time.perf_counter() - started, 'prof'
+            )
+            profiler.dump_stats(get_profile_path(name))
+        trim_profiles()
+        response['X-Profile-Id'] = name
+        return response
+
+
+@admin.site.admin_view
+def profiles_view(request):
+    """Страница админки со списком профилей"""
+    return TemplateResponse(request, 'admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'profiles': list_profiles(),
+        'max_count': settings.PROFILES_MAX_COUNT,
+    })
+
+
+@admin.site.admin_view
+def profile_download_view(request, name):
+    path = get_profile_path(name)
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+
+
+@admin.site.admin_view
+def profile_stats_view(request, name):
+    """Самые затратные функции профиля cProfile текстом"""
+    path = get_profile_path(name)
+    if not name.endswith('.prof') or not os.path.exists(path):
+        raise Http404
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    sort = request.GET.get('sort')
+    stats.sort_stats(sort if sort in STATS_SORT_KEYS else STATS_SORT_KEYS[0])
+    stats.print_stats(STATS_LIMIT)
+    return HttpResponse(output.getvalue(), content_type='text/plain')
@@ -0,0 +1,160 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (CharField, Prefetch, Value,
+                              prefetch_related_objects)
+
+from api.models import (FavoriteRecipe, IngredientToRecipe, ShoppingList,
+                        Subscription)
+
+from .recipe_index import recipe_index
+from .response_cache import bump_generation
+
+RECIPE_VERSION_KEY = 'recipe_version:{recipe_id}'
+RECIPE_CATALOGUE_KEY = 'recipe_catalogue_generation'
+RECIPE_BODY_KEY = 'recipe_body:{catalogue}:{host}:{recipe_id}:{version}'
+FAVORITE, CART, SUBSCRIPTION = 'favorite', 'cart', 'subscription'
+
+
+def get_catalogue_generation():
+    """Поколение тегов и ингредиентов, которые входят в тела рецептов"""
+    generation = cache.get(RECIPE_CATALOGUE_KEY)
+    if generation is None:
+        generation = uuid4().hex
+        if not cache.add(RECIPE_CATALOGUE_KEY, generation, timeout=None):
+            generation = cache.get(RECIPE_CATALOGUE_KEY, generation)
+    return generation
+
+
+def bump_catalogue_generation():
+    """Делает устаревшими тела всех рецептов после изменения тегов
+    или ингредиентов"""
+    cache.set(RECIPE_CATALOGUE_KEY, uuid4().hex, timeout=None)
+
+
+def bump_recipe_versions(*recipe_ids):
+    """Делает устаревшими закешированные тела указанных рецептов"""
+    cache.delete_many([
+        RECIPE_VERSION_KEY.format(recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+    ])
+
+
+def invalidate_recipes(*recipe_ids):
+    """После коммита сбрасывает кеши рецептов и обновляет индекс.
+
+    Для изменений, после которых сигналы Recipe могут не прийти:
+    bulk-операции и сохранение без измененных полей.
+    """
+    def invalidate():
+        bump_recipe_versions(*recipe_ids)
+        bump_generation()
+        for recipe_id in recipe_ids:
+            recipe_index.notify(recipe_id)
+    transaction.on_commit(invalidate)
+
+
+def get_recipe_versions(recipe_ids):
+    keys = {
+        recipe_id: RECIPE_VERSION_KEY.format(recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+    }
+    found = cache.get_many(keys.values())
+    versions, missing = {}, {}
+    for recipe_id, key in keys.items():
+        if key not in found:
+            missing[key] = found[key] = uuid4().hex
+        versions[recipe_id] = found[key]
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return versions
+
+
+def get_user_flags(user, recipe_ids, author_ids):
+    """Избранное, список покупок и подписки пользователя одним запросом"""
+    def kind(name):
+        return Value(name, output_field=CharField())
+
+    rows = FavoriteRecipe.objects.filter(
+        user=user, favorite_recipe_id__in=recipe_ids
+    ).values_list(kind(FAVORITE), 'favorite_recipe_id').order_by().union(
+        ShoppingList.objects.filter(
+            user=user, shop_recipe_id__in=recipe_ids
+        ).values_list(kind(CART), 'shop_recipe_id').order_by(),
+        Subscription.objects.filter(
+            followers=user, following_id__in=author_ids
+        ).values_list(kind(SUBSCRIPTION), 'following_id').order_by(),
+        all=True
+    )
+    flags = {FAVORITE: set(), CART: set(), SUBSCRIPTION: set()}
+    for name, pk in rows:
+        flags[name].add(pk)
+    return flags
+
+
+def serialize_recipes(recipes, serializer):
+    """Тела рецептов из общего кеша плюс флаги текущего пользователя.
+
+    Тела не зависят от пользователя и кешируются по версии рецепта,
+    недостающие собираются одним набором prefetch-запросов.
+    """
+    if not recipes:
+        return []
+    request = serializer.context['request']
+    catalogue = get_catalogue_generation()
+    host = request.get_host()
+    versions = get_recipe_versions(recipe.id for recipe in recipes)
+    keys = {
+        recipe.id: RECIPE_BODY_KEY.format(
+            catalogue=catalogue, host=host,
+            recipe_id=recipe.id, version=versions[recipe.id]
+        )
+        for recipe in recipes
+    }
+    found = cache.get_many(keys.values())
+    bodies = {
+        recipe_id: found[key]
+        for recipe_id, key in keys.items() if key in found
+    }
+    missing = [recipe for recipe in recipes if recipe.id not in bodies]
+    if missing:
+        prefetch_related_objects(
+            missing,
+            'author',
+            'tags',
+            Prefetch(
+                'ingredienttorecipe_set',
+                queryset=IngredientToRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+        new_bodies = {
+            recipe.id: serializer.get_body(recipe) for recipe in missing
+        }
+        bodies.update(new_bodies)
+        cache.set_many(
+            {
+                keys[recipe_id]: body
+                for recipe_id, body in new_bodies.items()
+            },
+            settings.RECIPES_CACHE_TIMEOUT
+        )
+    flags = get_user_flags(
+        request.user,
+        list(keys),
+        {recipe.author_id for recipe in recipes}
+    )
+    result = []
+    for recipe in recipes:
+        data = dict(bodies[recipe.id])
+        data['author'] = dict(
+            data['author'],
+            is_subscribed=recipe.author_id in flags[SUBSCRIPTION]
+        )
+        data['is_favorited'] = recipe.id in flags[FAVORITE]
+        data['is_in_shopping_cart'] = recipe.id in flags[CART]
+        result.append(data)
+    return result
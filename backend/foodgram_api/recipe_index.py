@@ -0,0 +1,365 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from api.models import IngredientToRecipe, Recipe
+
+RECIPE_INDEX_VERSION_KEY = 'recipe_index_version'
+RECIPE_INDEX_CHANGE_KEY = 'recipe_index_change:{number}'
+RECIPE_INDEX_CHANGE_TIMEOUT = 60 * 60
+RECIPE_INDEX_MAX_CHANGES = 1000
+LOAD_CHUNK_SIZE = 10000
+DENSE_RATIO = 64
+
+
+def to_bitset(slots, size):
+    data = bytearray(size // 8 + 1)
+    for slot in slots:
+        data[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(data, 'little')
+
+
+def iter_bits(bitset):
+    """Номера установленных битов по возрастанию"""
+    bits = bin(bitset)[:1:-1]
+    position = bits.find('1')
+    while position != -1:
+        yield position
+        position = bits.find('1', position + 1)
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс ингредиент -> рецепты в памяти процесса.
+
+    Рецептам присваиваются слоты по возрастанию id. Частые ингредиенты
+    (не реже чем в каждом DENSE_RATIO-м рецепте) хранятся битовыми
+    масками по слотам, редкие - массивами слотов, так что память
+    растет не быстрее массивов. Совпадения по маскам считаются
+    побитовым сложением, по массивам - подсчетом слотов.
+
+    Изменения рецептов пишутся в журнал в общем кеше, другие процессы
+    применяют его не чаще раза в RECIPE_INDEX_CHECK_INTERVAL секунд,
+    а если журнал потерян или слишком длинный, перестраивают индекс.
+    """
+
+    def __init__(self, shared=True):
+        self._shared = shared
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = 0
+        self._checked_at = 0
+
+    def build(self, rows):
+        """Строит индекс по парам (recipe_id, ingredient_id),
+        отсортированным по recipe_id."""
+        recipe_ids = array('q')
+        sizes = array('H')
+        offsets = array('q', [0])
+        flat = array('I')
+        postings = {}
+        for recipe_id, group in groupby(rows, key=itemgetter(0)):
+            slot = len(recipe_ids)
+            ingredient_ids = {ingredient_id for _, ingredient_id in group}
+            recipe_ids.append(recipe_id)
+            sizes.append(len(ingredient_ids))
+            flat.extend(ingredient_ids)
+            offsets.append(len(flat))
+            for ingredient_id in ingredient_ids:
+                slots = postings.get(ingredient_id)
+                if slots is None:
+                    slots = postings[ingredient_id] = array('I')
+                slots.append(slot)
+        total = len(recipe_ids)
+        bitsets = {
+            ingredient_id: to_bitset(postings.pop(ingredient_id), total)
+            for ingredient_id, slots in list(postings.items())
+            if len(slots) * DENSE_RATIO >= total
+        }
+        by_size = {}
+        for slot, size in enumerate(sizes):
+            by_size.setdefault(size, []).append(slot)
+        self._recipe_ids = recipe_ids
+        self._sizes = sizes
+        self._size_bitsets = {
+            size: to_bitset(slots, total) for size, slots in by_size.items()
+        }
+        self._offsets = offsets
+        self._flat = flat
+        self._overrides = {}
+        self._bitsets = bitsets
+        self._postings = postings
+        self._loaded = True
+
+    def _load(self):
+        self.build(
+            IngredientToRecipe.objects.order_by('recipe_id').values_list(
+                'recipe_id', 'ingredient_id'
+            ).iterator(chunk_size=LOAD_CHUNK_SIZE)
+        )
+
+    def _find_slot(self, recipe_id):
+        recipe_ids = self._recipe_ids
+        slot = bisect_left(recipe_ids, recipe_id)
+        if slot < len(recipe_ids) and recipe_ids[slot] == recipe_id:
+            return slot
+        return None
+
+    def _ingredients_of(self, slot):
+        if slot in self._overrides:
+            return self._overrides[slot]
+        return self._flat[self._offsets[slot]:self._offsets[slot + 1]]
+
+    def _add_slot(self, ingredient_id, slot):
+        if ingredient_id in self._bitsets:
+            self._bitsets[ingredient_id] |= 1 << slot
+        else:
+            self._postings.setdefault(ingredient_id, array('I')).append(slot)
+
+    def _remove_slot(self, ingredient_id, slot):
+        if ingredient_id in self._bitsets:
+            self._bitsets[ingredient_id] &= ~(1 << slot)
+        else:
+            self._postings[ingredient_id].remove(slot)
+
+    def _set_size(self, slot, size):
+        bit = 1 << slot
+        if slot < len(self._sizes):
+            old = self._sizes[slot]
+            if old:
+                self._size_bitsets[old] &= ~bit
+            self._sizes[slot] = size
+        else:
+            self._sizes.append(size)
+        if size:
+            self._size_bitsets[size] = self._size_bitsets.get(size, 0) | bit
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """Заменяет ингредиенты рецепта, пустой набор удаляет рецепт.
+
+        Возвращает False, если рецепт нельзя добавить в конец индекса
+        (его id меньше последнего) и индекс нужно перестроить.
+        """
+        slot = self._find_slot(recipe_id)
+        if slot is None:
+            if not ingredient_ids:
+                return True
+            if self._recipe_ids and recipe_id < self._recipe_ids[-1]:
+                return False
+            slot = len(self._recipe_ids)
+            self._recipe_ids.append(recipe_id)
+            self._flat.extend(ingredient_ids)
+            self._offsets.append(len(self._flat))
+        else:
+            for ingredient_id in self._ingredients_of(slot):
+                self._remove_slot(ingredient_id, slot)
+            self._overrides[slot] = tuple(ingredient_ids)
+        self._set_size(slot, len(ingredient_ids))
+        for ingredient_id in ingredient_ids:
+            self._add_slot(ingredient_id, slot)
+        return True
+
+    def _apply(self, recipe_ids):
+        recipe_ids = set(recipe_ids)
+        ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in IngredientToRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].add(ingredient_id)
+        for recipe_id in sorted(recipe_ids):
+            if not self.set_recipe(recipe_id, ingredients[recipe_id]):
+                self._load()
+                return
+
+    def _shared_version(self):
+        cache.add(RECIPE_INDEX_VERSION_KEY, 0, timeout=None)
+        return cache.get(RECIPE_INDEX_VERSION_KEY, 0)
+
+    def _catch_up(self, version):
+        """Применяет журнал изменений, False - если его не хватает"""
+        if version < self._version:
+            return False
+        if version == self._version:
+            return True
+        if version - self._version > RECIPE_INDEX_MAX_CHANGES:
+            return False
+        keys = [
+            RECIPE_INDEX_CHANGE_KEY.format(number=number)
+            for number in range(self._version + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        self._apply(changes.values())
+        return True
+
+    def _ensure_loaded(self):
+        if not self._shared:
+            return
+        now = time.monotonic()
+        if (self._loaded and now - self._checked_at
+                < settings.RECIPE_INDEX_CHECK_INTERVAL):
+            return
+        with self._lock:
+            version = self._shared_version()
+            if not self._loaded or not self._catch_up(version):
+                self._load()
+            self._version = version
+            self._checked_at = now
+
+    def notify(self, recipe_id):
+        """Записывает изменение рецепта в журнал и применяет его локально"""
+        cache.add(RECIPE_INDEX_VERSION_KEY, 0, timeout=None)
+        number = cache.incr(RECIPE_INDEX_VERSION_KEY)
+        cache.touch(RECIPE_INDEX_VERSION_KEY, timeout=None)
+        cache.set(
+            RECIPE_INDEX_CHANGE_KEY.format(number=number),
+            recipe_id,
+            RECIPE_INDEX_CHANGE_TIMEOUT
+        )
+        with self._lock:
+            if self._loaded:
+                self._apply([recipe_id])
+
+    def _count_dense(self, bitsets):
+        """Побитовые разряды количества совпавших частых ингредиентов"""
+        planes = []
+        for carry in bitsets:
+            for position, plane in enumerate(planes):
+                planes[position], carry = plane ^ carry, plane & carry
+                if not carry:
+                    break
+            if carry:
+                planes.append(carry)
+        return planes
+
+    def _split_counts(self, planes, dense_total):
+        """Маски рецептов ровно с m совпавшими частыми ингредиентами"""
+        full = (1 << len(self._recipe_ids)) - 1
+        inverted = [full ^ plane for plane in planes]
+        equal = [0]
+        for matched in range(1, min(dense_total + 1, 1 << len(planes))):
+            mask = full
+            for position, plane in enumerate(planes):
+                mask &= (
+                    plane if matched >> position & 1 else inverted[position]
+                )
+            equal.append(mask)
+        return equal
+
+    def search(self, ingredient_ids, max_missing=0):
+        """id рецептов, для которых не хватает не больше max_missing
+        ингредиентов, по убыванию доли имеющихся ингредиентов.
+
+        Рецепты, подходящие по одним частым ингредиентам, выбираются
+        масками. Рецепты с редкими ингредиентами проверяются по одному,
+        но сначала отсеиваются маской "частых совпадений не меньше t".
+        """
+        self._ensure_loaded()
+        ingredient_ids = set(ingredient_ids)
+        found = []
+        with self._lock:
+            dense = [
+                self._bitsets[ingredient_id] for ingredient_id
+                in ingredient_ids if ingredient_id in self._bitsets
+            ]
+            counts = Counter()
+            for ingredient_id in ingredient_ids:
+                slots = self._postings.get(ingredient_id)
+                if slots:
+                    counts.update(slots)
+            planes = self._count_dense(dense)
+            equal = self._split_counts(planes, len(dense))
+            qualified = 0
+            for matched in range(1, len(equal)):
+                for size, bitset in self._size_bitsets.items():
+                    if matched <= size <= matched + max_missing:
+                        qualified |= equal[matched] & bitset
+            length = len(self._recipe_ids) // 8 + 1
+            at_least, mask = [], 0
+            for matched in reversed(equal):
+                mask |= matched
+                at_least.append(mask.to_bytes(length, 'little'))
+            at_least.reverse()
+            candidates = set(iter_bits(qualified))
+            sizes = self._sizes
+            for slot, matched in counts.items():
+                need = sizes[slot] - matched - max_missing
+                if need <= 0 or need < len(at_least) and (
+                    at_least[need][slot >> 3] >> (slot & 7) & 1
+                ):
+                    candidates.add(slot)
+            planes_bytes = [
+                plane.to_bytes(length, 'little') for plane in planes
+            ]
+            recipe_ids = self._recipe_ids
+            for slot in candidates:
+                byte, bit = slot >> 3, slot & 7
+                matched = counts.get(slot, 0) + sum(
+                    (data[byte] >> bit & 1) << position
+                    for position, data in enumerate(planes_bytes)
+                )
+                size = sizes[slot]
+                if size - matched <= max_missing:
+                    found.append((
+                        -matched / size, size - matched, -recipe_ids[slot]
+                    ))
+        found.sort()
+        return [-recipe_id for _, _, recipe_id in found]
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def stats(self):
+        self._ensure_loaded()
+        with self._lock:
+            arrays = (
+                self._recipe_ids, self._sizes, self._offsets, self._flat,
+                *self._postings.values()
+            )
+            bitsets = (
+                *self._bitsets.values(), *self._size_bitsets.values()
+            )
+            return {
+                'recipes': len(self._recipe_ids),
+                'ingredients': len(self._postings) + len(self._bitsets),
+                'dense_ingredients': len(self._bitsets),
+                'bytes': sum(
+                    data.itemsize * len(data) for data in arrays
+                ) + sum(bitset.bit_length() // 8 for bitset in bitsets)
+            }
+
+
+recipe_index = RecipeIngredientIndex()
+
+
+def find_recipes(ingredient_ids, max_missing=0):
+    """id рецептов, которые можно приготовить из указанных ингредиентов.
+
+    Использует индекс в памяти, если он включен в настройках,
+    иначе считает совпадения одним запросом к БД.
+    """
+    if settings.RECIPE_INDEX_ENABLED:
+        return recipe_index.search(ingredient_ids, max_missing)
+    return list(Recipe.objects.annotate(
+        matched=Count(
+            'ingredienttorecipe',
+            filter=Q(ingredienttorecipe__ingredient_id__in=ingredient_ids)
+        ),
+        size=Count('ingredienttorecipe')
+    ).filter(
+        matched__gt=0,
+        size__lte=F('matched') + max_missing
+    ).annotate(
+        coverage=Cast('matched', FloatField()) / F('size'),
+        missing=F('size') - F('matched')
+    ).order_by('-coverage', 'missing', '-id').values_list('id', flat=True))
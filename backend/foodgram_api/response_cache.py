@@ -0,0 +1,94 @@
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+RECIPES_GENERATION_KEY = 'recipes_generation'
+RECIPES_RESPONSE_KEY = 'recipes_response:{generation}:{digest}'
+RECIPES_LOCK_KEY = 'recipes_response_lock:{generation}:{digest}'
+
+
+def get_generation():
+    generation = cache.get(RECIPES_GENERATION_KEY)
+    if generation is None:
+        generation = uuid4().hex
+        if not cache.add(RECIPES_GENERATION_KEY, generation, timeout=None):
+            generation = cache.get(RECIPES_GENERATION_KEY, generation)
+    return generation
+
+
+def bump_generation():
+    """Делает устаревшими все закешированные ответы с рецептами"""
+    cache.set(RECIPES_GENERATION_KEY, uuid4().hex, timeout=None)
+
+
+def get_request_digest(request, action, **kwargs):
+    """Нормализованный ключ запроса: действие, хост, путь и параметры"""
+    params = sorted(
+        (name, tuple(sorted(values)))
+        for name, values in request.query_params.lists()
+    )
+    raw = repr((action, request.get_host(), sorted(kwargs.items()), params))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def get_or_compute(key, lock_key, compute):
+    """Достает ответ из кеша или считает его.
+
+    Пересчитывает пропавший ключ только тот процесс, который взял
+    блокировку, остальные ждут готового результата, пока блокировка
+    не снята, но не дольше RECIPES_CACHE_LOCK_TIMEOUT секунд.
+    """
+    data = cache.get(key)
+    if data is not None:
+        return data, True
+    timeout = settings.RECIPES_CACHE_LOCK_TIMEOUT
+    locked = cache.add(lock_key, 1, timeout)
+    if not locked:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            data = cache.get(key)
+            if data is not None:
+                return data, True
+            if cache.get(lock_key) is None:
+                break
+    try:
+        response = compute()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RECIPES_CACHE_TIMEOUT)
+        return response, False
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+class AnonymousCacheMixin:
+    """Кеширует ответы list и retrieve для анонимных пользователей"""
+
+    def cached(self, request, method, *args, **kwargs):
+        if (request.user.is_authenticated
+                or not settings.RECIPES_CACHE_ENABLED):
+            return method(request, *args, **kwargs)
+        generation = get_generation()
+        digest = get_request_digest(request, self.action, **kwargs)
+        result, hit = get_or_compute(
+            RECIPES_RESPONSE_KEY.format(
+                generation=generation, digest=digest
+            ),
+            RECIPES_LOCK_KEY.format(generation=generation, digest=digest),
+            lambda: method(request, *args, **kwargs)
+        )
+        response = Response(result) if hit else result
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, super().retrieve, *args, **kwargs)
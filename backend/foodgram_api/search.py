@@ -0,0 +1,29 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+SEARCH_CONFIG = 'russian'
+SEARCH_ORDERING = ('-rank', '-id')
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, с релевантностью в поле rank.
+
+    В PostgreSQL ищет по search_vector (триггер пересчитывает его при
+    изменении названия или описания) с русской морфологией, в остальных
+    СУБД, например в SQLite для локальных тестов, - по LIKE.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        )
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+    ).annotate(rank=Case(
+        When(name__icontains=query, then=Value(1.0)),
+        default=Value(0.5),
+        output_field=FloatField()
+    ))
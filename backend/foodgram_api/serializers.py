@@ -1,5 +1,10 @@
+from uuid import uuid4
+
 import webcolors
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
@@ -7,6 +12,13 @@ from api.models import (FavoriteRecipe, Ingredient, IngredientToRecipe, Recipe,
                         ShoppingList, Subscription, Tag)
 from users.models import FoodGramUser
 
+from .counters import change_counter
+from .images import get_srcset, inspect_image
+from .recipe_cache import invalidate_recipes, serialize_recipes
+from .shopping_cart import (add_recipe_to_cart, apply_cart_changes,
+                            get_amounts_changes, get_cart_users)
+from .tag_cache import tag_catalogue
+
 
 class Hex2NameColor(serializers.Field):
     """Поле для преобразования hex кода цвета в название"""
@@ -21,6 +33,60 @@ class Hex2NameColor(serializers.Field):
         return data
 
 
+class CachedTagField(serializers.PrimaryKeyRelatedField):
+    """Поле тега, которое ищет id в кеше тегов, а не в БД"""
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        tag = tag_catalogue.get_tag_object(pk)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
+
+class ImageSrcsetField(serializers.Field):
+    """Поле со строками srcset уменьшенных копий картинки рецепта"""
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image_variants')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return get_srcset(value, self.context.get('request'))
+
+
+class HeaderCheckedImageField(serializers.ImageField):
+    """Картинка, которая проверяется по заголовку, а не полным
+    декодированием, и сохраняется под именем с расширением по формату"""
+    def to_internal_value(self, data):
+        file = serializers.FileField.to_internal_value(self, data)
+        if file.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Картинка больше {settings.IMAGE_UPLOAD_MAX_SIZE} байт.'
+            )
+        extension = inspect_image(file)
+        file.name = f'{uuid4()}.{extension}'
+        return file
+
+
+class RecipeImageField(Base64ImageField, HeaderCheckedImageField):
+    """Картинка рецепта: строка base64 в JSON или файл multipart-запроса"""
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            return HeaderCheckedImageField.to_internal_value(self, data)
+        if isinstance(data, str):
+            encoded = data.partition(';base64,')[2] or data
+            if len(encoded) * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE:
+                raise serializers.ValidationError(
+                    f'Картинка больше {settings.IMAGE_UPLOAD_MAX_SIZE} байт.'
+                )
+        return super().to_internal_value(data)
+
+
 class UserShortSerializer(serializers.ModelSerializer):
     """Краткий сериализатор для модели User"""
     is_subscribed = serializers.SerializerMethodField(
@@ -36,6 +102,8 @@ class UserShortSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return request.user.is_authenticated and Subscription.objects.filter(
             followers=request.user,
@@ -46,18 +114,30 @@ class UserShortSerializer(serializers.ModelSerializer):
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Краткий сериализатор для модели Recipe"""
     image = serializers.ImageField(use_url=True)
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'name',
-            'image', 'cooking_time'
+            'image', 'image_srcset',
+            'cooking_time'
         )
 
 
+def get_recipes_limit(request):
+    """Количество рецептов автора в подписках из ?recipes_limit="""
+    limit = request.query_params.get('recipes_limit', '')
+    if limit.isdigit() and int(limit) > 0:
+        return min(int(limit), settings.SUBSCRIPTION_RECIPES_LIMIT)
+    return settings.SUBSCRIPTION_RECIPES_LIMIT
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор GET-запросов к модели User"""
-    recipes = RecipeShortSerializer(many=True)
+    recipes = serializers.SerializerMethodField(
+        method_name='get_recipes'
+    )
     is_subscribed = serializers.SerializerMethodField(
         method_name='get_is_subscribed'
     )
@@ -74,10 +154,22 @@ class UserSerializer(serializers.ModelSerializer):
             'recipes', 'recipes_count'
         )
 
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.order_by('-id')[
+                :get_recipes_limit(self.context.get('request'))
+            ]
+        return RecipeShortSerializer(
+            recipes, many=True, context=self.context
+        ).data
+
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author__id=obj.id).count()
+        return obj.recipes_count
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return request.user.is_authenticated and Subscription.objects.filter(
             followers=request.user,
@@ -169,6 +261,14 @@ class AddIngredientSerializer(serializers.ModelSerializer):
         )
 
 
+class CachedRecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов с общим кешем тел и флагами пользователя"""
+    def to_representation(self, data):
+        if not self.context.get('use_body_cache'):
+            return super().to_representation(data)
+        return serialize_recipes(list(data), self.child)
+
+
 class RecipeGetSerializer(serializers.ModelSerializer):
     """Сериализатор для GET-запросов к Recipe"""
     tags = TagSerializer(
@@ -186,6 +286,7 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited'
     )
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
@@ -193,16 +294,31 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             'id', 'tags',
             'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image',
+            'name', 'image', 'image_srcset',
             'text', 'cooking_time'
         )
         read_only_fields = ('author', )
+        list_serializer_class = CachedRecipeListSerializer
+
+    def to_representation(self, instance):
+        if self.context.get('use_body_cache'):
+            return serialize_recipes([instance], self)[0]
+        return super().to_representation(instance)
+
+    def get_body(self, instance):
+        """Представление рецепта без флагов конкретного пользователя"""
+        instance.is_favorited = False
+        instance.is_in_shopping_cart = False
+        instance.author.is_subscribed = False
+        return super().to_representation(instance)
 
     def get_ingredients(self, obj):
-        ingredients = IngredientToRecipe.objects.filter(recipe=obj)
+        ingredients = obj.ingredienttorecipe_set.all()
         return IngredToRecipeSerializer(ingredients, many=True).data
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return request.user.is_authenticated and ShoppingList.objects.filter(
             user=request.user,
@@ -210,6 +326,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return request.user.is_authenticated and FavoriteRecipe.objects.filter(
             user=request.user,
@@ -220,12 +338,12 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 class RecipePostSerializer(serializers.ModelSerializer):
     """Сериализатор для POST, PATCH - запросов к модели Recipe"""
     ingredients = AddIngredientSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = CachedTagField(
         queryset=Tag.objects.all(),
         many=True,
         read_only=False
     )
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -243,22 +361,37 @@ class RecipePostSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Обязательно нужно указать хотя бы 1 тег'
             )
-        for tag in tags:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError(
-                    'Указанного вами тега не существует'
-                )
+        duplicate_tags = self.get_duplicates(tag.id for tag in tags)
+        if duplicate_tags:
+            raise serializers.ValidationError(
+                f'Теги указаны несколько раз: {duplicate_tags}'
+            )
         if not ingredients:
             raise serializers.ValidationError(
                 'Обязательно должен быть хотя бы 1 ингредиент'
             )
-        for ingredient in ingredients:
-            if not Ingredient.objects.filter(id=ingredient['id']).exists():
-                raise serializers.ValidationError(
-                    'Указанного вами игредиента не существует'
-                )
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        duplicate_ingredients = self.get_duplicates(ingredient_ids)
+        if duplicate_ingredients:
+            raise serializers.ValidationError(
+                f'Ингредиенты указаны несколько раз: {duplicate_ingredients}'
+            )
+        missing = set(ingredient_ids) - set(Ingredient.objects.filter(
+            id__in=ingredient_ids
+        ).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Указанных вами ингредиентов не существует: {sorted(missing)}'
+            )
         return data
 
+    @staticmethod
+    def get_duplicates(ids):
+        seen, duplicates = set(), set()
+        for pk in ids:
+            (duplicates if pk in seen else seen).add(pk)
+        return sorted(duplicates)
+
     def validate_cooking_time(self, value):
         if value < 1:
             raise serializers.ValidationError(
@@ -268,18 +401,63 @@ class RecipePostSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def create_ingredients(recipe, ingredients):
+        """Добавляет ингредиенты одним запросом.
+
+        bulk_create не отправляет сигналы, кеши и индекс сбрасывает
+        вызывающий код через invalidate_recipes.
+        """
         IngredientToRecipe.objects.bulk_create(
             [
                 IngredientToRecipe(
-                    ingredient=Ingredient.objects.get(
-                        id=ingredient['id']
-                    ),
+                    ingredient_id=ingredient['id'],
                     recipe=recipe,
                     amount=ingredient['amount']
                 ) for ingredient in ingredients
             ]
         )
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Изменяет только удаленные, измененные и новые ингредиенты.
+
+        Возвращает старый и новый состав рецепта {ingredient_id: amount}.
+        bulk_update и bulk_create не отправляют сигналы, кеши и индекс
+        сбрасывает вызывающий код через invalidate_recipes.
+        """
+        links = {
+            link.ingredient_id: link
+            for link in IngredientToRecipe.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: link.amount
+            for ingredient_id, link in links.items()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            IngredientToRecipe.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            link = links.get(ingredient_id)
+            if link is not None and link.amount != amount:
+                link.amount = amount
+                changed.append(link)
+        IngredientToRecipe.objects.bulk_update(changed, ['amount'])
+        RecipePostSerializer.create_ingredients(
+            recipe=recipe,
+            ingredients=[
+                ingredient for ingredient in ingredients
+                if ingredient['id'] not in links
+            ]
+        )
+        return old_amounts, new_amounts
+
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
@@ -292,30 +470,59 @@ class RecipePostSerializer(serializers.ModelSerializer):
             ingredients=ingredients
         )
         recipe.tags.set(tags)
+        invalidate_recipes(recipe.id)
+        change_counter(FoodGramUser, recipe.author_id, 'recipes_count', 1)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance = super().update(instance, validated_data)
-        instance.tags.clear()
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
         instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients(
+        old_amounts, new_amounts = self.update_ingredients(
             recipe=instance,
             ingredients=ingredients
         )
-        instance.save()
+        invalidate_recipes(instance.id)
+        apply_cart_changes(
+            get_cart_users(instance.id),
+            get_amounts_changes(old_amounts, new_amounts)
+        )
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'ingredienttorecipe_set',
+                queryset=IngredientToRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
         return RecipeGetSerializer(
             instance,
             context={'request': self.context.get('request')}
         ).data
 
 
+class CanCookSerializer(serializers.Serializer):
+    """Сериализатор параметров поиска рецептов по ингредиентам"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+    missing = serializers.IntegerField(
+        min_value=0,
+        max_value=settings.RECIPE_INDEX_MAX_MISSING,
+        default=0
+    )
+
+
 class PasswordSerializer(serializers.Serializer):
     """Сериализатор для изменения пароля"""
     current_password = serializers.CharField(required=True)
@@ -353,6 +560,14 @@ class SubscribeSerializer(serializers.ModelSerializer):
             )
         return data
 
+    @transaction.atomic
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        change_counter(
+            FoodGramUser, instance.following_id, 'followers_count', 1
+        )
+        return instance
+
     def to_representation(self, instance):
         return UserSerializer(
             instance.following,
@@ -381,6 +596,14 @@ class FavoriteSerializer(serializers.ModelSerializer):
             )
         return data
 
+    @transaction.atomic
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        change_counter(
+            Recipe, instance.favorite_recipe_id, 'favorites_count', 1
+        )
+        return instance
+
     def to_representation(self, instance):
         return RecipeShortSerializer(
             instance.favorite_recipe,
@@ -409,6 +632,13 @@ class ShoppingListSerializer(serializers.ModelSerializer):
             )
         return data
 
+    @transaction.atomic
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        add_recipe_to_cart(instance.user_id, instance.shop_recipe_id)
+        change_counter(Recipe, instance.shop_recipe_id, 'in_cart_count', 1)
+        return instance
+
     def to_representation(self, instance):
         return RecipeShortSerializer(
             instance.shop_recipe,
@@ -0,0 +1,262 @@
+import csv
+import io
+import os
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from api.models import IngredientToRecipe, ShoppingList, ShoppingListIngredient
+from users.models import FoodGramUser
+
+CART_VERSION_KEY = 'shopping_cart_version:{user_id}'
+CART_EXPORT_KEY = 'shopping_cart_export:{user_id}:{version}:{export_format}'
+CART_EXPORT_TIMEOUT = 60 * 60 * 24
+CART_HEADER = ['Наименование', 'Единица измерения', 'Количество']
+PDF_FONT_NAME = 'ShoppingCartFont'
+
+
+class Echo:
+    """Псевдо-буфер для потоковой записи csv"""
+    def write(self, value):
+        return value
+
+
+def get_cart_version(user_id):
+    """Возвращает текущую версию списка покупок пользователя"""
+    key = CART_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cart_version(*user_ids):
+    """Меняет версию списков покупок, делая кеш выгрузок устаревшим"""
+    cache.set_many(
+        {
+            CART_VERSION_KEY.format(user_id=user_id): uuid4().hex
+            for user_id in user_ids
+        },
+        timeout=None
+    )
+
+
+def get_cart_ingredients(user):
+    """Суммарное количество ингредиентов в списке покупок"""
+    return ShoppingListIngredient.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount'
+    ).order_by('ingredient__name')
+
+
+def get_recipe_amounts(recipe_id):
+    """Количество каждого ингредиента в рецепте"""
+    return dict(IngredientToRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount'))
+
+
+def get_amounts_changes(old_amounts, new_amounts):
+    """Разница между старым и новым составом рецепта"""
+    changes = {}
+    for ingredient_id in old_amounts.keys() | new_amounts.keys():
+        old_amount = old_amounts.get(ingredient_id)
+        new_amount = new_amounts.get(ingredient_id)
+        changes[ingredient_id] = (
+            (new_amount or 0) - (old_amount or 0),
+            (new_amount is not None) - (old_amount is not None)
+        )
+    return changes
+
+
+@transaction.atomic
+def apply_cart_changes(user_ids, changes):
+    """Применяет изменения к агрегированным спискам покупок.
+
+    changes - словарь {ingredient_id: (amount, recipes_count)} с
+    приращениями, которые добавляются к строкам каждого пользователя.
+    """
+    changes = {
+        ingredient_id: change
+        for ingredient_id, change in changes.items() if any(change)
+    }
+    if not user_ids or not changes:
+        return
+    list(FoodGramUser.objects.select_for_update().filter(
+        id__in=user_ids
+    ).order_by('id').values_list('id'))
+    rows = {
+        (row.user_id, row.ingredient_id): row
+        for row in ShoppingListIngredient.objects.filter(
+            user_id__in=user_ids,
+            ingredient_id__in=changes
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, (amount, recipes_count) in changes.items():
+            row = rows.get((user_id, ingredient_id))
+            if row is None:
+                if recipes_count > 0:
+                    to_create.append(ShoppingListIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                        recipes_count=recipes_count
+                    ))
+                continue
+            row.amount += amount
+            row.recipes_count += recipes_count
+            if row.recipes_count > 0:
+                to_update.append(row)
+            else:
+                to_delete.append(row.id)
+    ShoppingListIngredient.objects.bulk_create(to_create)
+    ShoppingListIngredient.objects.bulk_update(
+        to_update, ['amount', 'recipes_count']
+    )
+    ShoppingListIngredient.objects.filter(id__in=to_delete).delete()
+    transaction.on_commit(lambda: bump_cart_version(*user_ids))
+
+
+def add_recipe_to_cart(user_id, recipe_id):
+    apply_cart_changes([user_id], {
+        ingredient_id: (amount, 1)
+        for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+    })
+
+
+def remove_recipe_from_cart(user_ids, recipe_id):
+    apply_cart_changes(user_ids, {
+        ingredient_id: (-amount, -1)
+        for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+    })
+
+
+def get_cart_users(recipe_id):
+    return list(ShoppingList.objects.filter(
+        shop_recipe_id=recipe_id
+    ).values_list('user_id', flat=True))
+
+
+def compute_cart_totals(user_ids):
+    """Считает агрегированные списки покупок заново по ShoppingList"""
+    return {
+        (row['user_id'], row['shop_recipe__ingredienttorecipe__ingredient']):
+        (row['amount'], row['recipes_count'])
+        for row in ShoppingList.objects.filter(
+            user_id__in=user_ids,
+            shop_recipe__ingredienttorecipe__isnull=False
+        ).values(
+            'user_id',
+            'shop_recipe__ingredienttorecipe__ingredient'
+        ).annotate(
+            amount=Sum('shop_recipe__ingredienttorecipe__amount'),
+            recipes_count=Count('id')
+        ).order_by()
+    }
+
+
+def get_stored_cart_totals(user_ids):
+    return {
+        (row.user_id, row.ingredient_id): (row.amount, row.recipes_count)
+        for row in ShoppingListIngredient.objects.filter(
+            user_id__in=user_ids
+        )
+    }
+
+
+def cart_rows(ingredients):
+    for ingredient in ingredients:
+        yield [
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount']
+        ]
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo(), delimiter='-')
+    yield writer.writerow(CART_HEADER)
+    for row in cart_rows(ingredients):
+        yield writer.writerow(row)
+
+
+def render_txt(ingredients):
+    yield 'Список покупок\n\n'
+    for name, unit, amount in cart_rows(ingredients):
+        yield f'{name} ({unit}) — {amount}\n'
+
+
+def get_pdf_font():
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    if not os.path.exists(settings.PDF_FONT_PATH):
+        return 'Helvetica'
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, settings.PDF_FONT_PATH))
+    return PDF_FONT_NAME
+
+
+def render_pdf(ingredients):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    font = get_pdf_font()
+    width, height = A4
+    top = height - 50
+    y = top
+    pdf.setFont(font, 16)
+    pdf.drawString(50, y, 'Список покупок')
+    y -= 30
+    pdf.setFont(font, 12)
+    for name, unit, amount in cart_rows(ingredients):
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = top
+        pdf.drawString(50, y, f'{name} ({unit}) — {amount}')
+        y -= 20
+    pdf.save()
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'shoplist.csv', render_csv),
+    'txt': ('text/plain', 'shoplist.txt', render_txt),
+    'pdf': ('application/pdf', 'shoplist.pdf', render_pdf),
+}
+
+
+def get_cached_export(user_id, version, export_format):
+    return cache.get(CART_EXPORT_KEY.format(
+        user_id=user_id, version=version, export_format=export_format
+    ))
+
+
+def stream_export(user, version, export_format):
+    """Отдает файл по частям и кладет его в кеш после полной выгрузки"""
+    renderer = EXPORT_FORMATS[export_format][2]
+    chunks = []
+    for chunk in renderer(get_cart_ingredients(user)):
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        chunks.append(chunk)
+        yield chunk
+    cache.set(
+        CART_EXPORT_KEY.format(
+            user_id=user.id, version=version, export_format=export_format
+        ),
+        b''.join(chunks),
+        CART_EXPORT_TIMEOUT
+    )
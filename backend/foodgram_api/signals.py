@@ -0,0 +1,191 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.models import (Ingredient, IngredientToRecipe, Recipe, ShoppingList,
+                        Subscription, Tag)
+from users.models import FoodGramUser
+
+from .authentication import token_cache
+from .feed import backfill_subscription, fan_out_recipe, remove_subscription
+from .images import enqueue_image, release_images
+from .ingredient_index import ingredient_index
+from .recipe_cache import bump_catalogue_generation, bump_recipe_versions
+from .recipe_index import recipe_index
+from .response_cache import bump_generation
+from .shopping_cart import (bump_cart_version, get_cart_users,
+                            remove_recipe_from_cart)
+from .tag_cache import tag_catalogue
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def shopping_list_changed(sender, instance, **kwargs):
+    """Сбрасывает кеш выгрузки при изменении списка покупок"""
+    transaction.on_commit(lambda: bump_cart_version(instance.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(sender, instance, created, update_fields,
+                         **kwargs):
+    """Ставит новую картинку рецепта в очередь на уменьшение"""
+    if created or update_fields is None or 'image' in update_fields:
+        enqueue_image(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_replaced(sender, instance, update_fields, **kwargs):
+    """Удаляет прежнюю картинку после коммита, если она больше
+    никому не нужна"""
+    if instance.pk is None or not (
+            update_fields is None or 'image' in update_fields):
+        return
+    old = Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True
+    ).first()
+    if old and old != instance.image.name:
+        transaction.on_commit(lambda: release_images(old))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_released(sender, instance, **kwargs):
+    name = instance.image.name
+    transaction.on_commit(lambda: release_images(name))
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Вычитает удаляемый рецепт из агрегированных списков покупок"""
+    remove_recipe_from_cart(get_cart_users(instance.id), instance.id)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    """Сбрасывает индекс ингредиентов для автодополнения"""
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    """Меняет версию каталога тегов"""
+    transaction.on_commit(tag_catalogue.invalidate)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Убирает токен из кеша аутентификации при выходе.
+
+    Ключ запоминается сразу: после удаления Django обнуляет первичный
+    ключ экземпляра, а им у Token является key.
+    """
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.invalidate(key))
+
+
+@receiver(post_save, sender=FoodGramUser)
+def user_changed(sender, instance, created, **kwargs):
+    """Сбрасывает снимок пользователя после смены пароля, блокировки
+    или любого другого изменения"""
+    if not created:
+        transaction.on_commit(
+            lambda: token_cache.invalidate_user(instance.id)
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientToRecipe)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(sender, **kwargs):
+    """Сбрасывает кеш ответов с рецептами для анонимных пользователей"""
+    transaction.on_commit(bump_generation)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def catalogue_changed(sender, **kwargs):
+    """Теги и ингредиенты входят в тела всех рецептов"""
+    transaction.on_commit(bump_catalogue_generation)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_body_changed(sender, instance, **kwargs):
+    """Меняет версию тела рецепта"""
+    recipe_id = instance.id
+    transaction.on_commit(lambda: bump_recipe_versions(recipe_id))
+
+
+@receiver(post_save, sender=FoodGramUser)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    """Автор входит в тела рецептов и ответы для анонимных пользователей.
+
+    Сохранения только других полей, например last_login при входе,
+    кеши не сбрасывают.
+    """
+    if created or (update_fields is not None
+                   and not AUTHOR_FIELDS.intersection(update_fields)):
+        return
+    author_id = instance.id
+
+    def invalidate():
+        bump_recipe_versions(*Recipe.objects.filter(
+            author_id=author_id
+        ).values_list('id', flat=True))
+        bump_generation()
+    transaction.on_commit(invalidate)
+
+
+@receiver((post_save, post_delete), sender=IngredientToRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """Изменения ингредиентов по одному, например в админке.
+
+    API пишет ингредиенты bulk-операциями без сигналов и сбрасывает
+    кеши сам, см. recipe_cache.invalidate_recipes.
+    """
+    transaction.on_commit(lambda: bump_recipe_versions(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    recipe_ids = (pk_set or ()) if reverse else (instance.id,)
+    transaction.on_commit(lambda: bump_recipe_versions(*recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_index_changed(sender, instance, **kwargs):
+    """Обновляет индекс рецептов по ингредиентам после коммита"""
+    recipe_id = instance.id
+    transaction.on_commit(lambda: recipe_index.notify(recipe_id))
+
+
+@receiver((post_save, post_delete), sender=IngredientToRecipe)
+def recipe_index_ingredient_changed(sender, instance, **kwargs):
+    """Обновляет индекс при изменении ингредиентов по одному"""
+    transaction.on_commit(lambda: recipe_index.notify(instance.recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_fan_out(sender, instance, created, **kwargs):
+    """Добавляет новый рецепт в ленты подписчиков автора"""
+    if created and settings.FEED_TIMELINE_ENABLED:
+        fan_out_recipe(instance.id, instance.author_id)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    """Заполняет ленту рецептами автора при подписке"""
+    if created and settings.FEED_TIMELINE_ENABLED:
+        backfill_subscription(instance.followers_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    if settings.FEED_TIMELINE_ENABLED:
+        remove_subscription(instance.followers_id, instance.following_id)
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+HASHED_NAME = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.\w+$')
+
+
+def get_digest(content):
+    """SHA-256 содержимого файла, читается по частям"""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - хеш его содержимого.
+
+    Одинаковые картинки хранятся один раз по пути вида
+    ab/cd/abcd...ef.jpg, так что по одному URL всегда отдается одно
+    и то же содержимое. Повторная загрузка существующего файла обновляет
+    время его изменения. Удалять файл можно только когда на него
+    не ссылается ни один рецепт, см. foodgram_api.images.release_images.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = get_digest(content)
+        extension = os.path.splitext(name)[1].lower()
+        name = f'{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+        validate_file_name(name, allow_relative_path=True)
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        try:
+            os.utime(full_path)
+            return name
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                os.close(descriptor)
+                file_move_safe(
+                    content.temporary_file_path(), temp_path,
+                    allow_overwrite=True
+                )
+                try:
+                    content.close()
+                except FileNotFoundError:
+                    pass
+            else:
+                with os.fdopen(descriptor, 'wb') as file:
+                    for chunk in content.chunks():
+                        file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def is_recent(self, name, seconds):
+        """Файл сохранялся или загружался повторно за последние seconds
+        секунд"""
+        try:
+            modified = os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return time.time() - modified < seconds
+
+    @staticmethod
+    def is_hashed(name):
+        return HASHED_NAME.match(name) is not None
@@ -0,0 +1,82 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from api.models import Tag
+
+TAG_VERSION_KEY = 'tags_version'
+TAG_DATA_KEY = 'tags:{version}'
+TAG_DATA_TIMEOUT = 60 * 60 * 24
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+
+
+class TagCatalogue:
+    """Кеш списка тегов в памяти процесса и в общем кеше.
+
+    Версия каталога хранится в общем кеше и меняется сигналами модели
+    Tag, поэтому все процессы видят изменения сразу после коммита.
+    Данные в формате TagSerializer кешируются под своей версией.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._tags = None
+        self._by_id = None
+        self._by_slug = None
+
+    def invalidate(self):
+        cache.set(TAG_VERSION_KEY, uuid4().hex, timeout=None)
+
+    def get_version(self):
+        version = cache.get(TAG_VERSION_KEY)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(TAG_VERSION_KEY, version, timeout=None):
+                version = cache.get(TAG_VERSION_KEY, version)
+        return version
+
+    def get_tags(self):
+        """Возвращает версию каталога и список тегов"""
+        version = self.get_version()
+        if version != self._version:
+            key = TAG_DATA_KEY.format(version=version)
+            tags = cache.get(key)
+            if tags is None:
+                tags = list(Tag.objects.order_by('id').values(*TAG_FIELDS))
+                cache.set(key, tags, TAG_DATA_TIMEOUT)
+            self._by_id = {tag['id']: tag for tag in tags}
+            self._by_slug = {tag['slug']: tag for tag in tags}
+            self._tags = tags
+            self._version = version
+        return self._version, self._tags
+
+    def get_tag(self, pk):
+        """Тег по id из кеша или None"""
+        self.get_tags()
+        return self._by_id.get(pk)
+
+    def get_choices(self):
+        """Пары (slug, название) для фильтров"""
+        _, tags = self.get_tags()
+        return [(tag['slug'], tag['name']) for tag in tags]
+
+    def get_ids(self, slugs):
+        """id тегов по списку slug, неизвестные slug пропускаются"""
+        self.get_tags()
+        return [
+            self._by_slug[slug]['id'] for slug in slugs
+            if slug in self._by_slug
+        ]
+
+    def get_tag_object(self, pk):
+        """Экземпляр Tag из кеша, пригодный для записи в связи"""
+        tag = self.get_tag(pk)
+        if tag is None:
+            return None
+        return Tag.from_db(
+            DEFAULT_DB_ALIAS, TAG_FIELDS, [tag[field] for field in TAG_FIELDS]
+        )
+
+
+tag_catalogue = TagCatalogue()
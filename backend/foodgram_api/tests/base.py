@@ -0,0 +1,96 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import Ingredient, Tag
+from users.models import FoodGramUser
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(color='red'):
+    """Картинка в base64, как ее присылает фронтенд"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    },
+)
+class FoodgramTestCase(TestCase):
+    """Пользователи, теги и ингредиенты, общий кеш в памяти"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            FoodGramUser.objects.create_user(
+                username=f'user{number}',
+                email=f'user{number}@foodgram.ru',
+                password='Sup3r-secret',
+                first_name='Имя',
+                last_name='Фамилия'
+            )
+            for number in range(2)
+        ]
+        cls.tokens = [
+            Token.objects.create(user=user).key for user in cls.users
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=color, slug=f'tag{number}'
+            )
+            for number, color in enumerate(('#FF0000', '#00FF00'))
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.clients = []
+        for token in self.tokens:
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            self.clients.append(client)
+
+    def create_recipe(self, client, ingredients, tags=None, **fields):
+        """Рецепт через API с составом {ingredient: amount}"""
+        data = {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': make_image(),
+            'tags': [tag.id for tag in tags or self.tags[:1]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in ingredients.items()
+            ],
+            **fields
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
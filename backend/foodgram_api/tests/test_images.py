@@ -0,0 +1,72 @@
+import os
+
+from django.test import override_settings
+
+from api.models import Recipe, recipe_image_storage
+
+from .base import FoodgramTestCase, make_image
+
+
+class RecipeImageStorageTests(FoodgramTestCase):
+    """Картинки хранятся по хешу и удаляются, когда они никому не нужны"""
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.clients[0]
+        self.storage = recipe_image_storage()
+
+    def create(self, color):
+        recipe_id = self.create_recipe(
+            self.author, {self.ingredients[0]: 1}, image=make_image(color)
+        )
+        return recipe_id, Recipe.objects.get(id=recipe_id).image.name
+
+    def delete(self, recipe_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author.delete(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 204)
+
+    def exists(self, name):
+        return os.path.exists(self.storage.path(name))
+
+    def test_identical_uploads_share_file(self):
+        (_, name), (_, same) = self.create('green'), self.create('green')
+        _, other = self.create('blue')
+        self.assertEqual(name, same)
+        self.assertNotEqual(name, other)
+        self.assertTrue(self.storage.is_hashed(name))
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.storage.path(name))),
+            [os.path.basename(name)]
+        )
+
+    @override_settings(IMAGE_RELEASE_GRACE=0)
+    def test_referenced_file_is_kept(self):
+        (first, name), (second, _) = self.create('green'), self.create('green')
+        self.delete(first)
+        self.assertTrue(self.exists(name))
+        self.delete(second)
+        self.assertFalse(self.exists(name))
+
+    @override_settings(IMAGE_RELEASE_GRACE=0)
+    def test_replaced_image_is_released(self):
+        (first, name), (second, _) = self.create('green'), self.create('green')
+        for recipe_id, still_used in ((first, True), (second, False)):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.author.patch(
+                    f'/api/recipes/{recipe_id}/', {
+                        'image': make_image('yellow'),
+                        'tags': [self.tags[0].id],
+                        'ingredients': [
+                            {'id': self.ingredients[0].id, 'amount': 1}
+                        ],
+                    }, format='json'
+                )
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(self.exists(name), still_used)
+
+    @override_settings(IMAGE_RELEASE_GRACE=60 * 60)
+    def test_recent_file_is_kept(self):
+        recipe_id, name = self.create('green')
+        self.delete(recipe_id)
+        self.assertTrue(self.exists(name))
@@ -0,0 +1,81 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+BEFORE = [('api', '0007_shoppinglistingredient')]
+AFTER = [('api', '0008_ingredient_unique')]
+
+
+class MergeDuplicateIngredientsTests(TransactionTestCase):
+    """Дубликаты ингредиентов сливаются до ограничения уникальности"""
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        other_apps = [
+            node for node in executor.loader.graph.leaf_nodes()
+            if node[0] != 'api'
+        ]
+        return executor.loader.project_state(targets + other_apps).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged(self):
+        apps = self.migrate(BEFORE)
+        User = apps.get_model('users', 'FoodGramUser')
+        Recipe = apps.get_model('api', 'Recipe')
+        Ingredient = apps.get_model('api', 'Ingredient')
+        IngredientToRecipe = apps.get_model('api', 'IngredientToRecipe')
+        ShoppingListIngredient = apps.get_model(
+            'api', 'ShoppingListIngredient'
+        )
+        user = User.objects.create(username='user', email='user@foodgram.ru')
+        kept, *duplicates = [
+            Ingredient.objects.create(name='Соль', measurement_unit='г')
+            for _ in range(3)
+        ]
+        other = Ingredient.objects.create(name='Соль', measurement_unit='кг')
+        both, single = [
+            Recipe.objects.create(
+                author=user, name=name, text='Описание', cooking_time=5,
+                image='recipe.png'
+            )
+            for name in ('Оба', 'Один')
+        ]
+        for recipe, ingredient, amount in (
+            (both, kept, 1), (both, duplicates[0], 2),
+            (single, duplicates[1], 4),
+        ):
+            IngredientToRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        for ingredient in (kept, duplicates[0]):
+            ShoppingListIngredient.objects.create(
+                user=user, ingredient=ingredient, amount=3, recipes_count=1
+            )
+
+        apps = self.migrate(AFTER)
+        Ingredient = apps.get_model('api', 'Ingredient')
+        IngredientToRecipe = apps.get_model('api', 'IngredientToRecipe')
+        ShoppingListIngredient = apps.get_model(
+            'api', 'ShoppingListIngredient'
+        )
+        self.assertEqual(
+            set(Ingredient.objects.values_list('id', flat=True)),
+            {kept.id, other.id}
+        )
+        self.assertEqual(
+            set(IngredientToRecipe.objects.values_list(
+                'recipe_id', 'ingredient_id', 'amount'
+            )),
+            {(both.id, kept.id, 3), (single.id, kept.id, 4)}
+        )
+        self.assertEqual(
+            list(ShoppingListIngredient.objects.values_list(
+                'ingredient_id', 'amount', 'recipes_count'
+            )),
+            [(kept.id, 6, 2)]
+        )
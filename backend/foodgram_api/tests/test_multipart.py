@@ -0,0 +1,85 @@
+import io
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from api.models import Recipe
+
+from .base import FoodgramTestCase
+
+
+def make_upload():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'blue').save(buffer, 'PNG')
+    return SimpleUploadedFile('photo.png', buffer.getvalue(), 'image/png')
+
+
+class MultiPartRecipeTests(FoodgramTestCase):
+    """Рецепт с картинкой файлом в multipart/form-data"""
+
+    def setUp(self):
+        super().setUp()
+        self.fields = {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        self.ingredients = [
+            {'id': self.ingredients[0].id, 'amount': 5},
+            {'id': self.ingredients[1].id, 'amount': 7},
+        ]
+        self.tag_ids = [tag.id for tag in self.tags]
+
+    def post(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.clients[0].post(
+                '/api/recipes/', {**data, 'image': make_upload()},
+                format='multipart'
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get(id=response.json()['id'])
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)), set(self.tag_ids)
+        )
+        self.assertEqual(
+            sorted(recipe.ingredienttorecipe_set.values_list(
+                'ingredient_id', 'amount'
+            )),
+            [(item['id'], item['amount']) for item in self.ingredients]
+        )
+        self.assertTrue(recipe.image.name)
+
+    def test_json_data_field(self):
+        self.post({'data': json.dumps({
+            **self.fields,
+            'tags': self.tag_ids,
+            'ingredients': self.ingredients,
+        })})
+
+    def test_plain_form_fields(self):
+        self.post({
+            **self.fields,
+            'tags': self.tag_ids,
+            'ingredients': json.dumps(self.ingredients),
+        })
+
+    def test_indexed_form_fields(self):
+        self.post({
+            **self.fields,
+            'tags': self.tag_ids,
+            **{
+                f'ingredients[{index}]{key}': value
+                for index, item in enumerate(self.ingredients)
+                for key, value in item.items()
+            },
+        })
+
+    def test_invalid_json(self):
+        response = self.clients[0].post(
+            '/api/recipes/',
+            {**self.fields, 'tags': self.tag_ids, 'ingredients': '[{',
+             'image': make_upload()},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 400)
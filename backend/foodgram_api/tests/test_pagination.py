@@ -0,0 +1,43 @@
+from django.db.models import F
+
+from api.models import Recipe
+
+from .base import FoodgramTestCase
+
+
+class CursorPaginationTests(FoodgramTestCase):
+    """Курсор листает рецепты по неизменяемому ключу"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe_ids = [
+            self.create_recipe(
+                self.clients[0], {self.ingredients[0]: 1},
+                name=f'Рецепт {number}'
+            )
+            for number in range(7)
+        ]
+        Recipe.objects.update(popularity=F('id'))
+
+    def test_pages_survive_popularity_update(self):
+        seen = []
+        url = '/api/recipes/?pagination=cursor&page_size=3'
+        while url:
+            response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [recipe['id'] for recipe in response.json()['results']]
+            Recipe.objects.update(popularity=-F('popularity'))
+            url = response.json()['next']
+        self.assertEqual(seen, sorted(self.recipe_ids, reverse=True))
+
+    def test_mutable_orderings_are_rejected(self):
+        for query in ('ordering=popular', 'ordering=quick', 'search=Рецепт'):
+            for client in (self.anonymous, self.clients[1]):
+                with self.subTest(query=query, client=client):
+                    response = client.get(
+                        f'/api/recipes/?pagination=cursor&{query}'
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('pagination', response.json())
+        response = self.anonymous.get('/api/recipes/?ordering=popular')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,122 @@
+from django.core.cache import cache
+
+from api.models import FavoriteRecipe, ShoppingList, Subscription
+from foodgram_api.timing import assert_query_budget
+
+from .base import FoodgramTestCase, make_image
+
+RECIPES_PER_AUTHOR = 4
+
+
+class QueryBudgetTests(FoodgramTestCase):
+    """Запросы к БД по эндпоинтам укладываются в REQUEST_BUDGETS.
+
+    Данных достаточно, чтобы N+1 в сериализаторах превысил бюджет:
+    у каждого рецепта несколько тегов и ингредиентов, есть избранное,
+    список покупок и подписки. Кеш перед каждым запросом пустой.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.reader = self.clients[1]
+        self.recipe_ids = [
+            self.create_recipe(
+                client,
+                {
+                    ingredient: number + 1
+                    for ingredient in self.ingredients[number % 2:]
+                },
+                tags=self.tags,
+                name=f'Рецепт {number}'
+            )
+            for client in self.clients
+            for number in range(RECIPES_PER_AUTHOR)
+        ]
+        reader = self.users[1]
+        for recipe_id in self.recipe_ids[::2]:
+            FavoriteRecipe.objects.create(
+                user=reader, favorite_recipe_id=recipe_id
+            )
+            ShoppingList.objects.create(user=reader, shop_recipe_id=recipe_id)
+        Subscription.objects.create(
+            followers=reader, following=self.users[0]
+        )
+
+    def assert_budget(self, client, method, path, *args, **kwargs):
+        cache.clear()
+        response = assert_query_budget(client, method, path, *args, **kwargs)
+        self.assertLess(response.status_code, 400, f'{method} {path}')
+        return response
+
+    def recipe_data(self, amount):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': make_image(),
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient in self.ingredients
+            ],
+        }
+
+    def test_read_endpoints(self):
+        author_id = self.users[0].id
+        recipe_id = self.recipe_ids[0]
+        ingredients = '&'.join(
+            f'ingredients={ingredient.id}' for ingredient in self.ingredients
+        )
+        for client in (self.anonymous, self.reader):
+            for path in (
+                '/api/recipes/',
+                '/api/recipes/?pagination=cursor',
+                f'/api/recipes/?tags=tag0&tags=tag1&author={author_id}',
+                f'/api/recipes/{recipe_id}/',
+                f'/api/recipes/can_cook/?{ingredients}&missing=1',
+                '/api/tags/',
+                '/api/ingredients/?name=Ингр',
+                f'/api/users/{author_id}/',
+            ):
+                with self.subTest(path=path, client=client):
+                    self.assert_budget(client, 'get', path)
+        for path in (
+            '/api/recipes/?is_favorited=1&is_in_shopping_cart=1',
+            '/api/recipes/feed/',
+            '/api/recipes/download_shopping_cart/',
+            '/api/users/',
+            '/api/users/me/',
+            '/api/users/subscriptions/',
+            '/api/users/subscriptions/?recipes_limit=2',
+        ):
+            with self.subTest(path=path):
+                self.assert_budget(self.reader, 'get', path)
+
+    def test_recipe_writes(self):
+        author = self.clients[0]
+        recipe_id = self.recipe_ids[0]
+        self.assert_budget(
+            author, 'post', '/api/recipes/', self.recipe_data(1),
+            format='json'
+        )
+        self.assert_budget(
+            author, 'patch', f'/api/recipes/{recipe_id}/',
+            self.recipe_data(2), format='json'
+        )
+        self.assert_budget(
+            author, 'put', f'/api/recipes/{recipe_id}/',
+            self.recipe_data(3), format='json'
+        )
+        self.assert_budget(author, 'delete', f'/api/recipes/{recipe_id}/')
+
+    def test_user_actions(self):
+        client = self.clients[0]
+        recipe_id = self.recipe_ids[-1]
+        for path in (
+            f'/api/recipes/{recipe_id}/favorite/',
+            f'/api/recipes/{recipe_id}/shopping_cart/',
+            f'/api/users/{self.users[1].id}/subscribe/',
+        ):
+            for method in ('post', 'delete'):
+                with self.subTest(path=path, method=method):
+                    self.assert_budget(client, method, path)
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+
+from foodgram_api.recipe_cache import (RECIPE_BODY_KEY,
+                                       get_catalogue_generation,
+                                       get_recipe_versions)
+
+from .base import FoodgramTestCase
+
+
+class RecipeBodyCacheTests(FoodgramTestCase):
+    """Тела рецептов сбрасываются по версии рецепта и каталогу"""
+
+    def body_key(self, recipe_id):
+        return RECIPE_BODY_KEY.format(
+            catalogue=get_catalogue_generation(),
+            host='testserver',
+            recipe_id=recipe_id,
+            version=get_recipe_versions([recipe_id])[recipe_id]
+        )
+
+    def test_other_recipe_change_keeps_body(self):
+        first, second = self.ingredients[:2]
+        author, reader = self.clients
+        recipe_id = self.create_recipe(author, {first: 1})
+        other_id = self.create_recipe(author, {second: 2})
+        reader.get(f'/api/recipes/{recipe_id}/')
+        self.assertIsNotNone(cache.get(self.body_key(recipe_id)))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = author.patch(f'/api/recipes/{other_id}/', {
+                'tags': [self.tags[1].id],
+                'ingredients': [{'id': second.id, 'amount': 3}],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNotNone(cache.get(self.body_key(recipe_id)))
+
+    def test_tag_change_refreshes_bodies(self):
+        reader = self.clients[1]
+        recipe_id = self.create_recipe(
+            self.clients[0], {self.ingredients[0]: 1}
+        )
+        reader.get(f'/api/recipes/{recipe_id}/')
+        tag = self.tags[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = 'Завтрак'
+            tag.save()
+        response = reader.get(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.json()['tags'][0]['name'], 'Завтрак')
+
+    def test_author_change_refreshes_bodies(self):
+        recipe_id = self.create_recipe(
+            self.clients[0], {self.ingredients[0]: 1}
+        )
+        path = f'/api/recipes/{recipe_id}/'
+        for client in (self.anonymous, self.clients[1]):
+            client.get(path)
+        author = self.users[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            author.first_name = 'Новое'
+            author.save()
+        for client in (self.anonymous, self.clients[1]):
+            with self.subTest(client=client):
+                response = client.get(path)
+                self.assertEqual(
+                    response.json()['author']['first_name'], 'Новое'
+                )
+
+    def test_last_login_keeps_bodies(self):
+        recipe_id = self.create_recipe(
+            self.clients[0], {self.ingredients[0]: 1}
+        )
+        self.clients[1].get(f'/api/recipes/{recipe_id}/')
+        key = self.body_key(recipe_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.anonymous.post('/api/auth/token/login/', {
+                'email': self.users[0].email, 'password': 'Sup3r-secret'
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(cache.get(key))
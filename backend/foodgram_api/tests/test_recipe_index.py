@@ -0,0 +1,105 @@
+import random
+
+from django.test import override_settings
+
+from api.models import Ingredient, IngredientToRecipe, Recipe
+from foodgram_api.recipe_index import RecipeIngredientIndex, find_recipes
+
+from .base import FoodgramTestCase
+
+RECIPES = 200
+QUERIES = 300
+
+
+@override_settings(RECIPE_INDEX_CHECK_INTERVAL=0)
+class RecipeIndexTests(FoodgramTestCase):
+    """Индекс "что приготовить" отвечает так же, как запрос к БД.
+
+    Частых ингредиентов хватает на битовые маски, редкие хранятся
+    массивами слотов, так что проверяются оба пути поиска.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredient_ids = [
+            ingredient.id for ingredient in Ingredient.objects.bulk_create(
+                Ingredient(name=f'Продукт {number}', measurement_unit='г')
+                for number in range(40)
+            )
+        ]
+        cls.random = random.Random(2024)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.users[number % 2], name=f'Рецепт {number}',
+                text='Описание', cooking_time=10, image='recipe.png'
+            )
+            for number in range(RECIPES)
+        )
+        IngredientToRecipe.objects.bulk_create(
+            IngredientToRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=1
+            )
+            for recipe in recipes
+            for ingredient_id in cls.random_ingredients()
+        )
+
+    @classmethod
+    def random_ingredients(cls):
+        """Первые ингредиенты частые, остальные встречаются редко"""
+        weights = [
+            20 if number < 8 else 1
+            for number in range(len(cls.ingredient_ids))
+        ]
+        return set(cls.random.choices(
+            cls.ingredient_ids, weights, k=cls.random.randint(1, 6)
+        ))
+
+    def search_orm(self, ingredient_ids, max_missing):
+        with override_settings(RECIPE_INDEX_ENABLED=False):
+            return find_recipes(ingredient_ids, max_missing)
+
+    def assert_matches_orm(self, index):
+        for _ in range(QUERIES):
+            ingredient_ids = self.random.sample(
+                self.ingredient_ids, self.random.randint(1, 12)
+            )
+            max_missing = self.random.randint(0, 3)
+            self.assertEqual(
+                index.search(ingredient_ids, max_missing),
+                self.search_orm(ingredient_ids, max_missing),
+                (ingredient_ids, max_missing)
+            )
+
+    def test_search_matches_orm(self):
+        index = RecipeIngredientIndex()
+        self.assert_matches_orm(index)
+        self.assertTrue(index.stats()['dense_ingredients'])
+
+    def test_changes_match_orm(self):
+        index, other_process = RecipeIngredientIndex(), RecipeIngredientIndex()
+        index.search(self.ingredient_ids[:1])
+        other_process.search(self.ingredient_ids[:1])
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        changed = self.random.sample(recipe_ids, 20)
+        for recipe_id in changed[:15]:
+            IngredientToRecipe.objects.filter(recipe_id=recipe_id).delete()
+            IngredientToRecipe.objects.bulk_create(
+                IngredientToRecipe(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=1
+                )
+                for ingredient_id in self.random_ingredients()
+            )
+        Recipe.objects.filter(id__in=changed[15:]).delete()
+        recipe = Recipe.objects.create(
+            author=self.users[0], name='Новый', text='Описание',
+            cooking_time=5, image='recipe.png'
+        )
+        IngredientToRecipe.objects.create(
+            recipe=recipe, ingredient_id=self.ingredient_ids[-1], amount=1
+        )
+        for recipe_id in (*changed, recipe.id):
+            index.notify(recipe_id)
+        self.assert_matches_orm(index)
+        self.assert_matches_orm(other_process)
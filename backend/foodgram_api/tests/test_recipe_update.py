@@ -0,0 +1,51 @@
+from .base import FoodgramTestCase
+
+
+class RecipeUpdateTests(FoodgramTestCase):
+    """Изменение рецепта сбрасывает кеши и индекс по ингредиентам"""
+
+    def get_amounts(self, client, recipe_id):
+        response = client.get(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, {
+            ingredient['id']: ingredient['amount']
+            for ingredient in response.json()['ingredients']
+        }
+
+    def can_cook(self, *ingredients):
+        query = '&'.join(
+            f'ingredients={ingredient.id}' for ingredient in ingredients
+        )
+        response = self.clients[1].get(f'/api/recipes/can_cook/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_patch_only_tags_and_ingredients(self):
+        first, second, third = self.ingredients[:3]
+        author = self.clients[0]
+        recipe_id = self.create_recipe(author, {first: 99, second: 10})
+        self.get_amounts(self.anonymous, recipe_id)
+        response, _ = self.get_amounts(self.anonymous, recipe_id)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.get_amounts(self.clients[1], recipe_id)
+        self.assertEqual(self.can_cook(first, second), [recipe_id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = author.patch(f'/api/recipes/{recipe_id}/', {
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': first.id, 'amount': 55},
+                    {'id': second.id, 'amount': 10},
+                    {'id': third.id, 'amount': 1},
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        expected = {first.id: 55, second.id: 10, third.id: 1}
+        response, amounts = self.get_amounts(self.anonymous, recipe_id)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(amounts, expected)
+        _, amounts = self.get_amounts(self.clients[1], recipe_id)
+        self.assertEqual(amounts, expected)
+        self.assertEqual(self.can_cook(first, second), [])
+        self.assertEqual(self.can_cook(first, second, third), [recipe_id])
@@ -0,0 +1,81 @@
+import csv
+
+from foodgram_api.shopping_cart import (compute_cart_totals,
+                                        get_stored_cart_totals)
+
+from .base import FoodgramTestCase
+
+
+class ShoppingCartExportTests(FoodgramTestCase):
+    """Выгрузка списка покупок следует за изменениями рецептов и списка"""
+
+    def setUp(self):
+        super().setUp()
+        self.author, self.reader = self.clients
+        salt, sugar, flour = self.ingredients[:3]
+        self.first = self.create_recipe(self.author, {salt: 1, sugar: 2})
+        self.second = self.create_recipe(self.author, {sugar: 3, flour: 4})
+        for recipe_id in (self.first, self.second):
+            self.request('post', f'/api/recipes/{recipe_id}/shopping_cart/')
+
+    def request(self, method, path, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.reader, method)(path, *args, **kwargs)
+        self.assertLess(response.status_code, 400, response)
+        return response
+
+    def download(self, export_format):
+        response = self.reader.get(
+            f'/api/recipes/download_shopping_cart/?format={export_format}'
+        )
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+
+    def assert_cart(self, expected):
+        """Выгрузка csv и txt, в том числе повторная из кеша"""
+        user_id = self.users[1].id
+        self.assertEqual(
+            get_stored_cart_totals([user_id]), compute_cart_totals([user_id])
+        )
+        for _ in range(2):
+            lines = self.download('csv').decode().splitlines()
+            rows = list(csv.reader(lines[1:], delimiter='-'))
+            self.assertEqual(
+                {name: int(amount) for name, _, amount in rows}, expected
+            )
+            txt = self.download('txt').decode()
+            for name, amount in expected.items():
+                self.assertIn(f'{name} (г) — {amount}\n', txt)
+        self.assertTrue(self.download('pdf').startswith(b'%PDF'))
+
+    def test_cart_totals(self):
+        self.assert_cart({
+            'Ингредиент 0': 1, 'Ингредиент 1': 5, 'Ингредиент 2': 4
+        })
+
+    def test_recipe_update_changes_totals(self):
+        self.assert_cart({
+            'Ингредиент 0': 1, 'Ингредиент 1': 5, 'Ингредиент 2': 4
+        })
+        salt, sugar, _, pepper = self.ingredients
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author.patch(f'/api/recipes/{self.first}/', {
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': sugar.id, 'amount': 7},
+                    {'id': pepper.id, 'amount': 2},
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_cart({
+            'Ингредиент 1': 10, 'Ингредиент 2': 4, 'Ингредиент 3': 2
+        })
+
+    def test_removal_and_deletion(self):
+        self.request('delete', f'/api/recipes/{self.first}/shopping_cart/')
+        self.assert_cart({'Ингредиент 1': 3, 'Ингредиент 2': 4})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.delete(f'/api/recipes/{self.second}/')
+        self.assert_cart({})
@@ -0,0 +1,61 @@
+from django.test import override_settings
+
+from foodgram_api.authentication import TokenCache
+
+from .base import FoodgramTestCase
+
+
+@override_settings(TOKEN_CACHE_SHARED=True)
+class TokenCacheTests(FoodgramTestCase):
+    """Отзыв токенов виден процессам, у которых снимок уже в памяти"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.users[0]
+        self.key = self.tokens[0]
+        self.process, self.other_process = TokenCache(), TokenCache()
+        self.process.set(self.key, self.user)
+        self.assertIsNotNone(self.other_process.get(self.key))
+
+    def test_logout_revokes_token_everywhere(self):
+        self.process.invalidate(self.key)
+        self.assertIsNone(self.other_process.get(self.key))
+        self.assertIsNone(self.process.get(self.key))
+
+    def test_user_change_invalidates_snapshots(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertIsNone(self.other_process.get(self.key))
+
+    def test_password_hash_is_not_cached(self):
+        field_names, _ = self.other_process.snapshot(self.user)
+        self.assertNotIn('password', field_names)
+
+
+@override_settings(TOKEN_CACHE_SHARED=True)
+class TokenDeletionTests(FoodgramTestCase):
+    """Удаленный токен отклоняется, в том числе внутри atomic()"""
+
+    def setUp(self):
+        super().setUp()
+        self.key = self.tokens[0]
+        self.client = self.clients[0]
+        self.other_process = TokenCache()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.assertIsNotNone(self.other_process.get(self.key))
+
+    def assert_rejected(self):
+        self.assertIsNone(self.other_process.get(self.key))
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_logout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_rejected()
+
+    def test_user_deletion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].delete()
+        self.assert_rejected()
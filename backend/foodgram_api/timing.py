@@ -0,0 +1,168 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+
+def get_endpoint(request, view_func):
+    """Имя эндпоинта вида RecipesViewSet.list или TokenCreateView.post"""
+    method = request.method.lower()
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        match = request.resolver_match
+        return match.view_name if match else view_func.__name__
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+def get_budget(endpoint):
+    budgets = settings.REQUEST_BUDGETS
+    return {**budgets['default'], **budgets.get(endpoint, {})}
+
+
+class RequestTiming:
+    """Количество запросов к БД и время по частям обработки запроса"""
+
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.db_time = 0
+        self.serializer_time = 0
+        self.total_time = 0
+        self.started = time.perf_counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def time_serializer(self, to_representation):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return to_representation(*args, **kwargs)
+            finally:
+                self.serializer_time += time.perf_counter() - started
+        return timed
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'serializer_ms': round(self.serializer_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries", '
+            f'serializer;dur={self.serializer_time * 1000:.2f}, '
+            f'total;dur={self.total_time * 1000:.2f}'
+        )
+
+    def exceeded(self, budget):
+        """Превышенные пункты бюджета эндпоинта"""
+        actual = {'queries': self.queries, 'total_ms': self.total_time * 1000}
+        return [
+            name for name, value in actual.items()
+            if name in budget and value > budget[name]
+        ]
+
+
+class RequestTimingMiddleware:
+    """Считает запросы к БД и время обработки по эндпоинтам.
+
+    С SERVER_TIMING_ENABLED замеры отдаются в заголовке Server-Timing,
+    превышения бюджетов из REQUEST_BUDGETS пишутся в лог одной
+    JSON-строкой.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request.timing = RequestTiming()
+        with connection.execute_wrapper(timing.record_query):
+            response = self.get_response(request)
+        timing.finish()
+        response.timing = timing
+        if timing.endpoint is None:
+            return response
+        if settings.SERVER_TIMING_ENABLED:
+            response['Server-Timing'] = timing.server_timing()
+        budget = get_budget(timing.endpoint)
+        exceeded = timing.exceeded(budget)
+        if exceeded:
+            logger.warning(json.dumps({
+                'event': 'request_budget_exceeded',
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **timing.as_dict(),
+                'budget': budget,
+                'exceeded': exceeded,
+            }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timing.endpoint = get_endpoint(request, view_func)
+
+
+class TimingMixin:
+    """Миксин для DRF-представлений: время сериализации ответа"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        timing = getattr(self.request, 'timing', None)
+        if timing is not None:
+            serializer.to_representation = timing.time_serializer(
+                serializer.to_representation
+            )
+        return serializer
+
+
+def assert_query_budget(client, method, path, *args, **kwargs):
+    """Выполняет запрос тестовым клиентом и проверяет число запросов
+    к БД по бюджету эндпоинта из REQUEST_BUDGETS.
+
+    Предназначена для тестов: N+1 в сериализаторах превышает бюджет
+    и роняет проверку со списком выполненных запросов. Обработчики
+    on_commit в продакшене выполняются внутри запроса, поэтому
+    в транзакции теста они выполняются и считаются здесь же.
+    """
+    with CaptureQueriesContext(connection) as context:
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            response = getattr(client, method.lower())(
+                path, *args, **kwargs
+            )
+    timing = getattr(response, 'timing', None)
+    assert timing is not None and timing.endpoint, (
+        f'{method} {path}: нет замеров, подключен ли '
+        'RequestTimingMiddleware?'
+    )
+    limit = get_budget(timing.endpoint).get('queries')
+    queries = len(context.captured_queries)
+    assert limit is None or queries <= limit, (
+        f'{timing.endpoint} ({method} {path}): {queries} запросов к БД '
+        f'при бюджете {limit}:\n' + '\n'.join(
+            query['sql'] for query in context.captured_queries
+        )
+    )
+    return response
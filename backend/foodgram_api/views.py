@@ -1,37 +1,55 @@
-import csv
-
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
+from django.http import (Http404, HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from api.models import (FavoriteRecipe, Ingredient, IngredientToRecipe, Recipe,
-                        ShoppingList, Subscription, Tag)
+from api.models import (FavoriteRecipe, FeedEntry, Ingredient,
+                        IngredientToRecipe, Recipe, ShoppingList, Subscription,
+                        Tag)
 from users.models import FoodGramUser
 
-from .filters import IngredientStartsWithFilter, RecipeFilter
-from .pagination import CustomPagination
+from .counters import change_counter
+from .filters import (IngredientStartsWithFilter, RecipeFilter,
+                      get_recipe_ordering)
+from .ingredient_index import ingredient_index
+from .pagination import (CursorPaginationMixin, CustomPagination,
+                         FeedCursorPagination)
+from .parsers import MultiPartJSONParser
 from .permissions import AuthorOrReadOnlyPermission
-from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          PasswordSerializer, RecipeGetSerializer,
-                          RecipePostSerializer, ShoppingListSerializer,
-                          SubscribeSerializer, TagSerializer,
-                          UserPostSerializer, UserSerializer,
-                          UserShortSerializer)
+from .recipe_index import find_recipes
+from .renderers import CSVRenderer, PDFRenderer, TXTRenderer
+from .response_cache import AnonymousCacheMixin
+from .serializers import (CanCookSerializer, FavoriteSerializer,
+                          IngredientSerializer, PasswordSerializer,
+                          RecipeGetSerializer, RecipePostSerializer,
+                          ShoppingListSerializer, SubscribeSerializer,
+                          TagSerializer, UserPostSerializer, UserSerializer,
+                          UserShortSerializer, get_recipes_limit)
+from .shopping_cart import (EXPORT_FORMATS, get_cached_export,
+                            get_cart_version, remove_recipe_from_cart,
+                            stream_export)
+from .tag_cache import tag_catalogue
+from .timing import TimingMixin
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(TimingMixin, AnonymousCacheMixin, CursorPaginationMixin,
+                     viewsets.ModelViewSet):
     """Viewset для обработки всех запросов к Recipe"""
-    queryset = Recipe.objects.all().order_by('-id')
     serializer_class = RecipeGetSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (AuthorOrReadOnlyPermission, )
+    parser_classes = (JSONParser, MultiPartJSONParser)
     pagination_class = CustomPagination
+    cursor_pagination_actions = ('list', )
 
     @staticmethod
     def post_method_for_actions(request, pk, serializers):
@@ -56,15 +74,22 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def delete_method_for_actions(model, user, recipe):
         """Статический метод DELETE для actions"""
         if model == FavoriteRecipe:
-            model.objects.filter(
-                user=user,
-                favorite_recipe=recipe
-            ).delete()
+            with transaction.atomic():
+                deleted, _ = model.objects.filter(
+                    user=user,
+                    favorite_recipe=recipe
+                ).delete()
+                if deleted:
+                    change_counter(Recipe, recipe.id, 'favorites_count', -1)
         else:
-            model.objects.filter(
-                user=user,
-                shop_recipe=recipe
-            ).delete()
+            with transaction.atomic():
+                deleted, _ = model.objects.filter(
+                    user=user,
+                    shop_recipe=recipe
+                ).delete()
+                if deleted:
+                    remove_recipe_from_cart([user.id], recipe.id)
+                    change_counter(Recipe, recipe.id, 'in_cart_count', -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -98,31 +123,152 @@ class RecipesViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[IsAuthenticated, ]
+        permission_classes=[IsAuthenticated, ],
+        renderer_classes=[CSVRenderer, TXTRenderer, PDFRenderer]
     )
     def download_shopping_cart(self, request):
-        """Метод для скачивания файла с количеством необходимых ингредиентов"""
-        ingredients = IngredientToRecipe.objects.filter(
-            recipe__shop_recipe__user=self.request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        response = HttpResponse(
-            content_type='text/csv',
-            headers={
-                'Content-Disposition': 'attachment; filename="shoplist.csv"'
-            }
+        """Метод для скачивания файла с количеством необходимых ингредиентов.
+
+        Формат выбирается параметром ?format=csv|txt|pdf, готовый файл
+        кешируется до изменения списка покупок и отдается с ETag.
+        """
+        user = self.request.user
+        export_format = request.accepted_renderer.format
+        content_type, filename, _ = EXPORT_FORMATS[export_format]
+        version = get_cart_version(user.id)
+        etag = f'"{version}-{export_format}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return HttpResponseNotModified(headers={'ETag': etag})
+        headers = {
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache'
+        }
+        content = get_cached_export(user.id, version, export_format)
+        if content is not None:
+            return HttpResponse(
+                content, content_type=content_type, headers=headers
+            )
+        return StreamingHttpResponse(
+            stream_export(user, version, export_format),
+            content_type=content_type,
+            headers=headers
         )
-        writer = csv.writer(response, delimiter='-')
-        writer.writerow(['Наименование', 'Единица измерения', 'Количество'])
-        for ingredient in ingredients:
-            writer.writerow(
-                [ingredient['ingredient__name'],
-                 ingredient['ingredient__measurement_unit'],
-                 ingredient['amount']]
+
+    @action(detail=False, methods=['get'])
+    def can_cook(self, request):
+        """Рецепты, которые можно приготовить из имеющихся ингредиентов.
+
+        ?ingredients= - id имеющихся ингредиентов, ?missing= - сколько
+        ингредиентов может не хватать. Рецепты идут по убыванию доли
+        имеющихся ингредиентов.
+        """
+        params = CanCookSerializer(data={
+            'ingredients': request.query_params.getlist('ingredients'),
+            'missing': request.query_params.get('missing', 0)
+        })
+        params.is_valid(raise_exception=True)
+        recipe_ids = self.paginate_queryset(find_recipes(
+            params.validated_data['ingredients'],
+            params.validated_data['missing']
+        ))
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, permission_classes=[IsAuthenticated, ])
+    def feed(self, request):
+        """Лента рецептов авторов из подписок, сначала новые.
+
+        Страницы выбираются по курсору: из таблицы лент по индексу
+        (user_id, recipe_id), если она включена, иначе из рецептов
+        подписок по индексу (author_id, id desc).
+        """
+        if settings.FEED_TIMELINE_ENABLED:
+            paginator = FeedCursorPagination('-recipe_id')
+            entries = paginator.paginate_queryset(
+                FeedEntry.objects.filter(user=request.user),
+                request,
+                view=self
+            )
+            recipes = self.get_queryset().in_bulk(
+                [entry.recipe_id for entry in entries]
             )
-        return response
+            page = [
+                recipes[entry.recipe_id] for entry in entries
+                if entry.recipe_id in recipes
+            ]
+        else:
+            paginator = FeedCursorPagination('-id')
+            page = paginator.paginate_queryset(
+                self.get_queryset().filter(
+                    author__in=Subscription.objects.filter(
+                        followers=request.user
+                    ).values('following')
+                ),
+                request,
+                view=self
+            )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def use_body_cache(self):
+        return (settings.RECIPE_BODY_CACHE_ENABLED
+                and self.request.user.is_authenticated
+                and self.action in ('list', 'retrieve', 'can_cook', 'feed'))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['use_body_cache'] = self.use_body_cache()
+        return context
+
+    def get_ordering(self):
+        return get_recipe_ordering(self.request)
+
+    def get_queryset(self):
+        """Рецепты с автором, тегами, ингредиентами и флагами пользователя.
+
+        Если тела рецептов берутся из кеша, связи и флаги подгружает
+        сериализатор, поэтому здесь выбираются только сами рецепты.
+        """
+        if self.use_body_cache():
+            return Recipe.objects.defer('search_vector').order_by('-id')
+        user = self.request.user
+        authors = FoodGramUser.objects.all()
+        queryset = Recipe.objects.defer('search_vector').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredienttorecipe_set',
+                queryset=IngredientToRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=Exists(Subscription.objects.filter(
+                    followers=user,
+                    following=OuterRef('pk')
+                ))
+            )
+            queryset = queryset.annotate(
+                is_favorited=Exists(FavoriteRecipe.objects.filter(
+                    user=user,
+                    favorite_recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                    user=user,
+                    shop_recipe=OuterRef('pk')
+                ))
+            )
+            queryset = queryset.prefetch_related(
+                Prefetch('author', queryset=authors)
+            )
+        else:
+            queryset = queryset.select_related('author')
+        return queryset.order_by('-id')
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -133,33 +279,75 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return serializer.save(author=self.request.user)
 
     def perform_destroy(self, instance):
-        print(instance.author)
         if instance.author != self.request.user:
             raise serializers.ValidationError(
                 'Вы не можете удалить чужой рецепт'
             )
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            change_counter(
+                FoodGramUser, instance.author_id, 'recipes_count', -1
+            )
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(TimingMixin, viewsets.ReadOnlyModelViewSet):
     """Viewset для обработки GET-запросов к Tags"""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    @staticmethod
+    def cached_response(request, etag, data):
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={settings.TAGS_MAX_AGE}'
+        }
+        if etag in request.headers.get('If-None-Match', ''):
+            return HttpResponseNotModified(headers=headers)
+        return Response(data, headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        """Список тегов из кеша с поддержкой условных запросов"""
+        version, tags = tag_catalogue.get_tags()
+        return self.cached_response(request, f'"tags-{version}"', tags)
+
+    def retrieve(self, request, *args, **kwargs):
+        version, _ = tag_catalogue.get_tags()
+        pk = self.kwargs['pk']
+        tag = tag_catalogue.get_tag(int(pk)) if pk.isdigit() else None
+        if tag is None:
+            raise Http404
+        return self.cached_response(request, f'"tags-{version}-{pk}"', tag)
+
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(TimingMixin, viewsets.ReadOnlyModelViewSet):
     """Viewset для обработки GET-запросов к Ingredients"""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientStartsWithFilter
 
+    def list(self, request, *args, **kwargs):
+        """Поиск по индексу в памяти, если он включен в настройках"""
+        name = request.query_params.get('name')
+        limit = request.query_params.get('limit')
+        limit = (int(limit) if limit and limit.isdigit()
+                 else settings.INGREDIENT_SEARCH_LIMIT)
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        if settings.INGREDIENT_INDEX_ENABLED:
+            return Response(ingredient_index.search(name, limit))
+        queryset = self.filter_queryset(self.get_queryset())[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
-class UsersViewSet(viewsets.ModelViewSet):
+
+class UsersViewSet(TimingMixin, CursorPaginationMixin,
+                   viewsets.ModelViewSet):
     """Viewset для обработки GET, POST - запросов к FoodGramUser"""
     queryset = FoodGramUser.objects.all()
     serializer_class = UserShortSerializer
     pagination_class = CustomPagination
+    cursor_pagination_actions = ('subscriptions', )
     permission_classes = (AllowAny, )
 
     @action(detail=False, methods=['post'])
@@ -168,12 +356,13 @@ class UsersViewSet(viewsets.ModelViewSet):
         user = self.request.user
         serializer = PasswordSerializer(data=request.data)
         if serializer.is_valid():
+            user.refresh_from_db(fields=['password'])
             if not user.check_password(
                 serializer.validated_data['current_password']
             ):
                 return Response({'current_password': 'Неверный пароль'})
             user.set_password(serializer.validated_data['new_password'])
-            user.save()
+            user.save(update_fields=['password'])
             return Response(status=status.HTTP_200_OK)
         else:
             return Response(
@@ -186,20 +375,20 @@ class UsersViewSet(viewsets.ModelViewSet):
         """Метод для отображения подписок пользователя"""
         queryset = FoodGramUser.objects.filter(
             following__followers=request.user
-        )
+        ).annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.order_by('-id')[
+                :get_recipes_limit(request)
+            ],
+            to_attr='limited_recipes'
+        ))
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = UserSerializer(
-                page,
-                context={'request': self.request},
-                many=True
-            )
+            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        serializer = UserSerializer(
-            queryset,
-            context={'request': self.request},
-            many=True
-        )
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @staticmethod
@@ -218,10 +407,15 @@ class UsersViewSet(viewsets.ModelViewSet):
     @staticmethod
     def delete_method_for_subscribe(model, user, author):
         """Статический метод DELETE для подписки на пользователя"""
-        model.objects.filter(
-            following=author,
-            followers=user
-        ).delete()
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(
+                following=author,
+                followers=user
+            ).delete()
+            if deleted:
+                change_counter(
+                    FoodGramUser, author.id, 'followers_count', -1
+                )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -238,6 +432,8 @@ class UsersViewSet(viewsets.ModelViewSet):
         return self.post_method_for_subscribe(request, pk, SubscribeSerializer)
 
     def get_serializer_class(self):
+        if self.action == 'subscriptions':
+            return UserSerializer
         if self.request.method == 'GET':
             return self.serializer_class
         return UserPostSerializer
@@ -0,0 +1,17 @@
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+
+def on_starting(server):
+    """Метрики прошлого запуска не должны попасть в суммы"""
+    django.setup()
+    from foodgram_api.metrics import clear_metrics
+    clear_metrics()
+
+
+def child_exit(server, worker):
+    from foodgram_api.metrics import mark_process_dead
+    mark_process_dead(worker.pid)